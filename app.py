@@ -1,11 +1,31 @@
-from flask import Flask, redirect, render_template, request, session, url_for, flash
+from flask import Flask, Response, redirect, render_template, request, session, url_for, flash, g, has_request_context
+from flask.cli import AppGroup
+from werkzeug.datastructures import MultiDict
 from models import db, User, Vibe
-from datetime import datetime
+from scoring import (
+    MUSIC_OPTIONS, MOVIE_OPTIONS, TOPIC_OPTIONS, MASK_WIDTH, JITTER_MULTIPLIER,
+    batch_scores, rank_candidates, encode_profile, jitter_bucket, jitter_seed
+)
+from interest_index import InterestIndex
+from events import EventBroker, StreamEvent, OVERFLOW
+from cache import TTLCache
+from profiling import RequestProfiler
+from collections import namedtuple
+from datetime import datetime, timedelta
 from pytz import timezone
-import random
 import requests
+import reddit
+import transfer
+import metrics
+import logs
+import click
+from sqlalchemy.orm import make_transient_to_detached
+from sqlalchemy import case, create_engine, func, inspect, literal, or_, text, type_coerce
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+import json
 import time
 import os
+import sys
 
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
@@ -14,6 +34,9 @@ db = SQLAlchemy()
 
 class User(db.Model):
     __tablename__ = 'users'
+    __table_args__ = (
+        db.Index('ix_users_joined_id', 'joined', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     reddit_username = db.Column(db.String(50), unique=True, nullable=False)
@@ -32,35 +55,340 @@ class User(db.Model):
 
 class Vibe(db.Model):
     __tablename__ = 'vibes'
+    __table_args__ = (
+        db.Index('ix_vibes_sender_status', 'sender', 'status'),
+        db.Index('ix_vibes_receiver_status', 'receiver', 'status'),
+        db.Index('uq_vibes_sender_receiver', 'sender', 'receiver', unique=True),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     sender = db.Column(db.String(50), nullable=False)
     receiver = db.Column(db.String(50), nullable=False)
+    sender_id = db.Column(db.Integer, db.ForeignKey('users.id'), index=True)
+    receiver_id = db.Column(db.Integer, db.ForeignKey('users.id'), index=True)
     status = db.Column(db.String(20), default='pending')  # pending, accepted, denied
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+class VibeHistory(db.Model):
+    __tablename__ = 'vibe_history'
+    
+    # Denied and expired vibes moved out of `vibes` by compact-vibes. Kept only
+    # so the sender is not shown the receiver again.
+    sender = db.Column(db.String(50), primary_key=True)
+    receiver = db.Column(db.String(50), primary_key=True)
+    status = db.Column(db.String(20), nullable=False)  # denied, expired
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class Match(db.Model):
+    __tablename__ = 'matches'
+    
+    # One row per matched pair, stored with user_a_id < user_b_id
+    user_a_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    user_b_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+def match_pair(user_id, other_id):
+    """Primary key of the matches row for two users"""
+    return (user_id, other_id) if user_id < other_id else (other_id, user_id)
+
+class Suggestion(db.Model):
+    __tablename__ = 'suggestions'
+    __table_args__ = (
+        db.Index('ix_suggestions_user_rank', 'user_id', 'rank'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    candidate_id = db.Column(db.Integer, nullable=False, index=True)
+    rank = db.Column(db.Integer, nullable=False)
+    score = db.Column(db.Float, nullable=False)
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class InterestMask(db.Model):
+    __tablename__ = 'interest_masks'
+    
+    # Interests as bitmasks over the scoring.py option lists, for SQL scoring
+    user_id = db.Column(db.Integer, primary_key=True)
+    music = db.Column(db.Integer, nullable=False, default=0)
+    movies = db.Column(db.Integer, nullable=False, default=0)
+    topics = db.Column(db.Integer, nullable=False, default=0)
+
+class Stat(db.Model):
+    __tablename__ = 'stats'
+    
+    # Running counters. bucket is '' for all-time totals, 'YYYY-MM-DD' for
+    # per-day counts and 'YYYY-MM-DDTHH' for per-hour counts.
+    name = db.Column(db.String(50), primary_key=True)
+    bucket = db.Column(db.String(13), primary_key=True, default='')
+    value = db.Column(db.Integer, nullable=False, default=0)
+
+class Event(db.Model):
+    __tablename__ = 'events'
+    
+    # Short-lived outbox read by every process's EventBroker poller
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False, index=True)
+    kind = db.Column(db.String(30), nullable=False)
+    payload = db.Column(db.Text, nullable=False, default='{}')
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+class SchemaMigration(db.Model):
+    __tablename__ = 'schema_migrations'
+    
+    # One row per entry of SCHEMA_MIGRATIONS applied to this database
+    version = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    description = db.Column(db.String(200), nullable=False)
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class KarmaRefresh(db.Model):
+    __tablename__ = 'karma_refresh'
+    
+    # When account_age/karma were last copied from Reddit for each user
+    user_id = db.Column(db.Integer, primary_key=True)
+    refreshed_at = db.Column(db.DateTime, nullable=False, index=True)
+
+class SuggestionList(db.Model):
+    __tablename__ = 'suggestion_lists'
+    
+    # When each user's stored suggestions were last computed, so an empty
+    # list is told apart from one that was never computed
+    user_id = db.Column(db.Integer, primary_key=True)
+    computed_at = db.Column(db.DateTime, nullable=False, index=True)
+
+class SuggestionRefresh(db.Model):
+    __tablename__ = 'suggestion_refresh'
+    
+    user_id = db.Column(db.Integer, primary_key=True)
+    requested_at = db.Column(db.DateTime, default=datetime.utcnow)
+
 app = Flask(__name__)
 app.secret_key = os.environ.get('SECRET_KEY')
 app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
-# Initialize database
+# JSON logs written by a background thread, tagged with X-Request-ID
+log = logs.init_app(app)
+
+# Initialize database. Tables are managed by `flask db upgrade`, so
+# importing the app opens no connections.
 db.init_app(app)
 
-with app.app_context():
-    try:
-        db.create_all()
-        print("Database tables created/verified")
-    except Exception as e:
-        print(f"Database initialization error: {e}")
-        
+# PROFILE_REQUESTS=1 adds a Server-Timing header (wall, SQL and template time,
+# query count) to every response and keeps per-route histograms for /debug.
+# Installed before the other hooks so it also times load_current_user.
+request_profiler = None
+if os.environ.get('PROFILE_REQUESTS', '').lower() in ('1', 'true', 'yes'):
+    request_profiler = RequestProfiler()
+    request_profiler.init_app(app)
+
+# Request, connection pool, Reddit and business metrics served at /metrics
+metrics.init_app(app, db)
+
 # Reddit OAuth config
 CLIENT_ID = os.environ.get('REDDIT_CLIENT_ID')
 CLIENT_SECRET = os.environ.get('REDDIT_CLIENT_SECRET')
 REDIRECT_URI = os.environ.get('REDIRECT_URI')
-USER_AGENT = 'VibeMatchApp/0.1'
 ADMIN_USERNAME = os.environ.get('ADMIN_USERNAME')
 
+# Admin user list
+ADMIN_TIMEZONE = timezone('Asia/Kolkata')
+ADMIN_PAGE_SIZE = 50
+ADMIN_MAX_PAGE_SIZE = 200
+
+# Matches pagination
+MATCHES_PAGE_SIZE = 30
+MATCHES_MAX_PAGE_SIZE = 100
+
+# Where candidates get scored: 'python' (NumPy over loaded rows) or 'sql'
+MATCH_SCORING_BACKEND = os.environ.get('MATCH_SCORING_BACKEND', 'python')
+
+# Precomputed suggestions kept per user by the refresh-suggestions worker
+SUGGESTIONS_TOP_N = int(os.environ.get('SUGGESTIONS_TOP_N', 200))
+# Stored lists older than this are recomputed by `refresh-suggestions --loop`,
+# which is also how new and changed profiles reach other users' lists
+SUGGESTIONS_MAX_AGE_MINUTES = int(os.environ.get('SUGGESTIONS_MAX_AGE_MINUTES', 360))
+
+# Rendered /matches pages, keyed by user id
+matches_cache = TTLCache(
+    maxsize=int(os.environ.get('MATCHES_CACHE_SIZE', 2048)),
+    ttl=int(os.environ.get('MATCHES_CACHE_TTL', 60))
+)
+# Only the first few default-size pages are cached, so one user cannot grow
+# their entry by walking arbitrary offsets
+MATCHES_CACHED_PAGES = int(os.environ.get('MATCHES_CACHED_PAGES', 3))
+
+# Signed-in users' (session profile_version, snapshot), keyed by user id
+profile_cache = TTLCache(
+    maxsize=int(os.environ.get('PROFILE_CACHE_SIZE', 4096)),
+    ttl=int(os.environ.get('PROFILE_CACHE_TTL', 30))
+)
+
+# Reddit account stats (account age, karma) seen at login, keyed by username.
+# Repeat logins within the TTL skip rewriting them.
+reddit_me_cache = TTLCache(
+    maxsize=int(os.environ.get('REDDIT_ME_CACHE_SIZE', 4096)),
+    ttl=int(os.environ.get('REDDIT_ME_CACHE_TTL', 6 * 3600))
+)
+
+# Karma older than this is refreshed by the refresh-karma worker
+KARMA_MAX_AGE_HOURS = int(os.environ.get('KARMA_MAX_AGE_HOURS', 24))
+
+# Pending vibes left unanswered this long are archived by compact-vibes
+VIBE_PENDING_TTL_DAYS = int(os.environ.get('VIBE_PENDING_TTL_DAYS', 30))
+
+# What matches.html needs from a suggested user
+MatchCard = namedtuple('MatchCard', ['id', 'reddit_username', 'nickname'])
+
+# Columns needed to score a candidate without loading the full profile
+SCORING_COLUMNS = (
+    User.id,
+    User.reddit_username,
+    User.age,
+    User.interests_music,
+    User.interests_movies,
+    User.interests_topics
+)
+
+# Per-process candidate index, rebuilt every few minutes to pick up writes
+# handled by other workers
+interest_index = InterestIndex(rebuild_after=int(os.environ.get('INTEREST_INDEX_TTL', 300)))
+
+def load_interest_index():
+    return db.session.query(*SCORING_COLUMNS).filter(
+        User.is_banned == False,
+        User.age.isnot(None),
+        User.nickname.isnot(None),
+        User.bio.isnot(None)
+    ).all()
+
+def dialect_insert():
+    """INSERT construct supporting ON CONFLICT for the bound database, if any"""
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+        return insert
+    if dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+        return insert
+    return None
+
+def upsert(model, rows):
+    """Insert rows, overwriting any that collide on the primary key"""
+    if not rows:
+        return
+    
+    insert = dialect_insert()
+    if insert is None:
+        for row in rows:
+            db.session.merge(model(**row))
+        return
+    
+    keys = [column.name for column in model.__table__.primary_key]
+    stmt = insert(model).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=keys,
+        set_={name: stmt.excluded[name] for name in rows[0] if name not in keys}
+    )
+    db.session.execute(stmt)
+
+def sync_interest_masks(user):
+    """Mirror a user's interest strings into interest_masks (in the current transaction)"""
+    music, movies, topics, _ = encode_profile(user)
+    upsert(InterestMask, [{'user_id': user.id, 'music': music, 'movies': movies, 'topics': topics}])
+
+# ---------------------- 📊 Stats Counters ----------------------
+
+def day_bucket(when):
+    return when.strftime('%Y-%m-%d')
+
+def hour_bucket(when):
+    return when.strftime('%Y-%m-%dT%H')
+
+def bump_stats(deltas):
+    """Add {(name, bucket): amount} to the stats counters in the current transaction"""
+    rows = [{'name': name, 'bucket': bucket, 'value': amount} for (name, bucket), amount in deltas.items() if amount]
+    if not rows:
+        return
+    
+    insert = dialect_insert()
+    if insert is None:
+        for row in rows:
+            stat = db.session.get(Stat, (row['name'], row['bucket']))
+            if stat:
+                stat.value += row['value']
+            else:
+                db.session.add(Stat(**row))
+        return
+    
+    stmt = insert(Stat).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['name', 'bucket'],
+        set_={'value': Stat.value + stmt.excluded.value}
+    )
+    db.session.execute(stmt)
+
+def read_stats(days=14, hours=48):
+    """All-time totals plus recent signups per day and vibes sent per hour, in one query"""
+    now = datetime.utcnow()
+    rows = Stat.query.filter(or_(
+        Stat.bucket == '',
+        (Stat.name == 'signups') & (Stat.bucket >= day_bucket(now - timedelta(days=days - 1))),
+        (Stat.name == 'vibes_sent') & (Stat.bucket >= hour_bucket(now - timedelta(hours=hours - 1)))
+    )).all()
+    
+    totals = {}
+    series = {'signups': {}, 'vibes_sent': {}}
+    for row in rows:
+        if row.bucket:
+            series[row.name][row.bucket] = row.value
+        else:
+            totals[row.name] = row.value
+    return totals, series
+
+# ---------------------- 🔐 Current User ----------------------
+
+def profile_snapshot(user):
+    """Detached copy of a user's columns that any session can merge without a query"""
+    snapshot = User(**{column.key: getattr(user, column.key) for column in User.__table__.columns})
+    make_transient_to_detached(snapshot)
+    return snapshot
+
+def forget_profile(user_id):
+    """Drop a cached profile snapshot after the row changed.
+
+    The cache is per process, so as with invalidate_matches the user's own
+    session carries a version that makes other workers reload the row.
+    """
+    profile_cache.pop(user_id)
+    if has_request_context() and session.get('user_id') == user_id:
+        session['profile_version'] = session.get('profile_version', 0) + 1
+
+@app.before_request
+def load_current_user():
+    """Load the signed-in user once per request into g.user"""
+    g.user = None
+    user_id = session.get('user_id')
+    if user_id is None:
+        return
+    
+    version = session.get('profile_version', 0)
+    entry = profile_cache.get(user_id)
+    if entry is not None and entry[0] == version:
+        # Bans are made from the admin's session, which cannot bump this
+        # version, so other workers see them once the snapshot expires
+        # (PROFILE_CACHE_TTL)
+        user = db.session.merge(entry[1], load=False)
+    else:
+        user = db.session.get(User, user_id)
+        if user:
+            profile_cache.set(user_id, (version, profile_snapshot(user)))
+    
+    if user and user.is_banned and request.endpoint not in ('landing', 'logout', 'static'):
+        flash("You have been banned.")
+        session.clear()
+        return redirect(url_for('landing'))
+    g.user = user
+
 # ---------------------- Authentication Routes ----------------------
 
 @app.route('/')
@@ -73,54 +401,32 @@ def login():
         return redirect(url_for('dashboard'))  # Already logged in
 
     # Start Reddit OAuth if not logged in
-    reddit_auth_url = (
-        "https://www.reddit.com/api/v1/authorize?"
-        f"client_id={CLIENT_ID}&response_type=code&state=random_string&"
-        f"redirect_uri={REDIRECT_URI}&duration=temporary&scope=identity"
-    )
+    reddit_auth_url = reddit.authorize_url(CLIENT_ID, REDIRECT_URI, state='random_string')
     return redirect(reddit_auth_url)
 
 @app.route('/callback')
 def callback():
-    print("=== CALLBACK ROUTE HIT ===")
     code = request.args.get('code')
     error = request.args.get('error')
     
     if error:
-        print(f"OAuth error: {error}")
+        log.warning("Reddit OAuth error", extra={'oauth_error': error})
         flash(f"Authorization failed: {error}")
         return redirect(url_for('landing'))
     
     if not code:
-        print("No authorization code received")
+        log.warning("Callback without an authorization code")
         flash("Authorization failed. No code received.")
         return redirect(url_for('landing'))
     
-    print(f"Authorization code received: {code[:10]}...")
-    
-    auth = requests.auth.HTTPBasicAuth(CLIENT_ID, CLIENT_SECRET)
-    headers = {"User-Agent": USER_AGENT}
-    data = {
-        'grant_type': 'authorization_code', 
-        'code': code, 
-        'redirect_uri': REDIRECT_URI
-    }
-
     try:
-        print("Requesting access token...")
-        token_response = requests.post(
-            "https://www.reddit.com/api/v1/access_token",
-            auth=auth, 
-            data=data, 
-            headers=headers,
-            timeout=10
+        # Pooled keep-alive session with connect/read timeouts and retries
+        token_response = metrics.reddit_call(
+            'access_token', reddit.exchange_code, code, CLIENT_ID, CLIENT_SECRET, REDIRECT_URI
         )
         
-        print(f"Token response status: {token_response.status_code}")
-        print(f"Token response: {token_response.text}")
-        
         if token_response.status_code != 200:
-            print(f"Token request failed: {token_response.status_code}")
+            log.warning("Reddit token request failed", extra={'status': token_response.status_code})
             flash("Failed to get access token from Reddit.")
             return redirect(url_for('landing'))
         
@@ -128,58 +434,52 @@ def callback():
         access_token = token_json.get('access_token')
 
         if not access_token:
-            print("No access token in response")
+            log.warning("Reddit token response had no access token")
             flash("Error during Reddit OAuth. No access token received.")
             return redirect(url_for('landing'))
 
-        print("Access token received, fetching user data...")
-        headers['Authorization'] = f'bearer {access_token}'
-        user_response = requests.get(
-            "https://oauth.reddit.com/api/v1/me", 
-            headers=headers,
-            timeout=10
-        )
-        
-        print(f"User response status: {user_response.status_code}")
+        user_response = metrics.reddit_call('me', reddit.fetch_me, access_token)
         
         if user_response.status_code != 200:
-            print(f"User data request failed: {user_response.status_code}")
+            log.warning("Reddit /me request failed", extra={'status': user_response.status_code})
             flash("Failed to get user data from Reddit.")
             return redirect(url_for('landing'))
         
         user_data = user_response.json()
-        print(f"User data: {user_data}")
 
         username = user_data.get('name')
         if not username:
-            print("No username in user data")
+            log.warning("Reddit /me response had no username")
             flash("Failed to get username from Reddit.")
             return redirect(url_for('landing'))
         
-        created_utc = user_data.get('created_utc', 0)
-        account_age = int((time.time() - created_utc) // (60 * 60 * 24))
-        total_karma = user_data.get('link_karma', 0) + user_data.get('comment_karma', 0)
+        account_age, total_karma = reddit.account_stats(user_data)
 
-        print(f"Processing user: {username}")
-        
         # Check if user already exists in database
         user = User.query.filter_by(reddit_username=username).first()
-        print(f"Existing user found: {user is not None}")
 
         if user:
             if user.is_banned:
-                print(f"User {username} is banned")
+                log.info("Banned user tried to log in", extra={'username': username})
                 flash("Your account has been banned.")
                 return redirect(url_for('landing'))
 
+            # The /me payload is fresh, so keep karma current at no extra upstream cost
+            if reddit_me_cache.get(username) != (account_age, total_karma):
+                user.account_age = account_age
+                user.karma = total_karma
+                mark_karma_refreshed(user.id)
+                db.session.commit()
+                forget_profile(user.id)
+                reddit_me_cache.set(username, (account_age, total_karma))
+            
             # User exists: store session and go to dashboard
             session['user_id'] = user.id
             session['username'] = username
-            print(f"Existing user logged in: {username}, redirecting to dashboard")
+            log.info("User logged in", extra={'username': username, 'user_id': user.id})
             return redirect(url_for('dashboard'))
 
         # New user: create user entry
-        print("Creating new user...")
         new_user = User(
             reddit_username=username,
             account_age=account_age,
@@ -189,31 +489,32 @@ def callback():
         
         try:
             db.session.add(new_user)
+            db.session.flush()
+            mark_karma_refreshed(new_user.id)
+            bump_stats({('users', ''): 1, ('signups', day_bucket(new_user.joined)): 1})
             db.session.commit()
-            print(f"New user created with ID: {new_user.id}")
+            metrics.record_event('signup')
+            log.info("New user signed up", extra={'username': username, 'user_id': new_user.id})
         except Exception as db_error:
-            print(f"Database error creating user: {db_error}")
+            log.error("Database error creating user", extra={'username': username, 'error': str(db_error)})
             db.session.rollback()
             flash("Database error. Please try again.")
             return redirect(url_for('landing'))
 
         session['user_id'] = new_user.id
         session['username'] = username
-        print(f"New user session created, redirecting to onboarding")
-        return redirect(url_for('onboarding_nickname'))
+        return redirect(onboarding_start())
 
     except requests.exceptions.Timeout:
-        print("Request timeout")
+        log.warning("Reddit request timed out")
         flash("Request timeout. Please try again.")
         return redirect(url_for('landing'))
     except requests.exceptions.RequestException as e:
-        print(f"Request error: {e}")
+        log.warning("Reddit request failed", extra={'error': str(e)})
         flash("Network error during authentication.")
         return redirect(url_for('landing'))
     except Exception as e:
-        print(f"Unexpected error in callback: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception("Unexpected error in callback")
         flash("Error during authentication. Please try again.")
         return redirect(url_for('landing'))
 
@@ -225,233 +526,291 @@ def logout():
     
 # ---------------------- 🧭 Onboarding Wizard ----------------------
 
+# Answers are buffered in the session and written in one transaction when
+# the review step is confirmed. ONBOARDING_ONE_PAGE=1 sends new users to a
+# single form that submits everything at once instead.
+ONBOARDING_ONE_PAGE = os.environ.get('ONBOARDING_ONE_PAGE', '').lower() in ('1', 'true', 'yes')
+
+ONBOARDING_FIELDS = (
+    'nickname', 'age', 'preferred_age_min', 'preferred_age_max', 'bio',
+    'interests_music', 'interests_movies', 'interests_topics'
+)
+
+# The draft lives in the cookie session, which browsers drop past about
+# 4 KB, so free-text answers are capped (the templates use the same limits)
+# and interests must come from the option lists
+NICKNAME_MAX_LENGTH = 20
+BIO_MAX_LENGTH = 500
+
+# A user's profile with the unsaved onboarding answers applied
+DraftProfile = namedtuple('DraftProfile', ONBOARDING_FIELDS)
+
+def onboarding_start():
+    return url_for('onboarding_single' if ONBOARDING_ONE_PAGE else 'onboarding_nickname')
+
+def save_draft(fields):
+    draft = dict(session.get('onboarding', {}))
+    draft.update(fields)
+    session['onboarding'] = draft
+
+def draft_profile(user):
+    draft = session.get('onboarding', {})
+    return DraftProfile(*(draft.get(field, getattr(user, field)) for field in ONBOARDING_FIELDS))
+
+def parse_nickname(form):
+    nickname = form.get('nickname', '').strip()
+    if not nickname:
+        return None, "Please enter a nickname."
+    if len(nickname) > NICKNAME_MAX_LENGTH:
+        return None, f"Nickname must be at most {NICKNAME_MAX_LENGTH} characters."
+    return {'nickname': nickname}, None
+
+def parse_age(form):
+    try:
+        age = int(form['age'])
+        preferred_age_min = int(form['preferred_age_min'])
+        preferred_age_max = int(form['preferred_age_max'])
+    except (KeyError, ValueError):
+        return None, "Please enter valid ages."
+    
+    if age < 13 or age > 100:
+        return None, "Age must be between 13 and 100."
+    if preferred_age_min > preferred_age_max:
+        return None, "Minimum preferred age cannot be greater than maximum."
+    return {'age': age, 'preferred_age_min': preferred_age_min, 'preferred_age_max': preferred_age_max}, None
+
+def parse_bio(form):
+    bio = form.get('bio', '').strip()
+    if not bio:
+        return None, "Please enter a bio."
+    if len(bio) > BIO_MAX_LENGTH:
+        return None, f"Bio must be at most {BIO_MAX_LENGTH} characters."
+    return {'bio': bio}, None
+
+def interests_parser(form_field, column, label, options):
+    def parse(form):
+        selected = [value for value in form.getlist(form_field) if value in options]
+        if not selected:
+            return None, f"Please select at least one {label} interest."
+        return {column: ','.join(selected)}, None
+    return parse
+
+parse_music = interests_parser('music_interests', 'interests_music', 'music', MUSIC_OPTIONS)
+parse_movies = interests_parser('movie_interests', 'interests_movies', 'movie', MOVIE_OPTIONS)
+parse_topics = interests_parser('topic_interests', 'interests_topics', 'topic', TOPIC_OPTIONS)
+
+# Wizard steps in order, with the parser that validates each
+ONBOARDING_STEPS = (
+    ('onboarding_nickname', parse_nickname),
+    ('onboarding_age', parse_age),
+    ('onboarding_bio', parse_bio),
+    ('onboarding_interests_music', parse_music),
+    ('onboarding_interests_movies', parse_movies),
+    ('onboarding_interests_topics', parse_topics),
+)
+ONBOARDING_PARSERS = tuple(parse for _, parse in ONBOARDING_STEPS)
+
+def split_interests(value):
+    return value.split(',') if value else []
+
+def draft_as_form(draft):
+    """The draft in the shape the step forms post it, so the parsers can re-check it"""
+    form = MultiDict()
+    for field in ('nickname', 'age', 'preferred_age_min', 'preferred_age_max', 'bio'):
+        value = getattr(draft, field)
+        if value is not None:
+            form.add(field, str(value))
+    for form_field, column in (('music_interests', 'interests_music'), ('movie_interests', 'interests_movies'),
+                               ('topic_interests', 'interests_topics')):
+        for value in split_interests(getattr(draft, column)):
+            form.add(form_field, value)
+    return form
+
+def wizard_step(parse, next_endpoint):
+    """Buffer a valid POST and move on; returns None to re-render the step"""
+    if request.method == 'POST':
+        fields, error = parse(request.form)
+        if fields:
+            save_draft(fields)
+            return redirect(url_for(next_endpoint))
+        flash(error)
+    return None
+
+def complete_onboarding(user, fields):
+    """Write every onboarding answer in a single transaction"""
+    for field, value in fields.items():
+        setattr(user, field, value)
+    sync_interest_masks(user)
+    queue_profile_refresh(user)
+    db.session.commit()
+    interest_index.update(user)
+    forget_profile(user.id)
+    session.pop('onboarding', None)
+
 @app.route('/onboarding/nickname', methods=['GET', 'POST'])
 def onboarding_nickname():
-    if 'user_id' not in session:
-        return redirect(url_for('landing'))
-    
-    user = User.query.get(session['user_id'])
+    user = g.user
     if not user:
         return redirect(url_for('landing'))
     
-    if request.method == 'POST':
-        nickname = request.form.get('nickname', '').strip()
-        if nickname:
-            user.nickname = nickname
-            db.session.commit()
-            return redirect(url_for('onboarding_age'))
-        else:
-            flash("Please enter a nickname.")
+    done = wizard_step(parse_nickname, 'onboarding_age')
+    if done:
+        return done
     
-    return render_template('onboarding_nickname.html', user=user)
+    draft = draft_profile(user)
+    return render_template('onboarding_nickname.html', user=user, nickname=draft.nickname)
 
 @app.route('/onboarding/age', methods=['GET', 'POST'])
 def onboarding_age():
-    if 'user_id' not in session:
-        return redirect(url_for('landing'))
-    
-    user = User.query.get(session['user_id'])
+    user = g.user
     if not user:
         return redirect(url_for('landing'))
     
-    if request.method == 'POST':
-        try:
-            age = int(request.form['age'])
-            preferred_age_min = int(request.form['preferred_age_min'])
-            preferred_age_max = int(request.form['preferred_age_max'])
-            
-            if age < 13 or age > 100:
-                flash("Age must be between 13 and 100.")
-                return render_template('onboarding_age.html', user=user)
-            
-            if preferred_age_min > preferred_age_max:
-                flash("Minimum preferred age cannot be greater than maximum.")
-                return render_template('onboarding_age.html', user=user)
-            
-            user.age = age
-            user.preferred_age_min = preferred_age_min
-            user.preferred_age_max = preferred_age_max
-            db.session.commit()
-            return redirect(url_for('onboarding_bio'))
-        except ValueError:
-            flash("Please enter valid ages.")
+    done = wizard_step(parse_age, 'onboarding_bio')
+    if done:
+        return done
     
-    return render_template('onboarding_age.html', user=user)
+    draft = draft_profile(user)
+    return render_template('onboarding_age.html', user=user, age=draft.age,
+                           preferred_age_min=draft.preferred_age_min, preferred_age_max=draft.preferred_age_max)
 
 @app.route('/onboarding/bio', methods=['GET', 'POST'])
 def onboarding_bio():
-    if 'user_id' not in session:
-        return redirect(url_for('landing'))
-    
-    user = User.query.get(session['user_id'])
+    user = g.user
     if not user:
         return redirect(url_for('landing'))
     
-    if request.method == 'POST':
-        bio = request.form.get('bio', '').strip()
-        if bio:
-            user.bio = bio
-            db.session.commit()
-            return redirect(url_for('onboarding_interests_music'))
-        else:
-            flash("Please enter a bio.")
+    done = wizard_step(parse_bio, 'onboarding_interests_music')
+    if done:
+        return done
     
-    return render_template('onboarding_bio.html', user=user)
+    return render_template('onboarding_bio.html', user=user, bio=draft_profile(user).bio)
 
 @app.route('/onboarding/interests/music', methods=['GET', 'POST'])
 def onboarding_interests_music():
-    if 'user_id' not in session:
-        return redirect(url_for('landing'))
-    
-    user = User.query.get(session['user_id'])
+    user = g.user
     if not user:
         return redirect(url_for('landing'))
     
-    music_options = [
-        'Rock (Stage ka Raja)',
-        'Pop (Chartbuster vibes)',
-        'Hip-Hop (DHH wannabe)',
-        'Jazz (Smooth swag)',
-        'Classical (Sitar & stuff)',
-        'Electronic (DJ wale babu)',
-        'Country (Gaon ki dhun)',
-        'Reggae (Chill maar bro)',
-        'Blues (Dil tut gaya)',
-        'Metal (Headbang warning)',
-        'Folk (Desi beats)',
-        'R&B (Romance mode on)'
-    ]
-
-    if request.method == 'POST':
-        selected_music = request.form.getlist('music_interests')
-        if selected_music:
-            user.interests_music = ','.join(selected_music)
-            db.session.commit()
-            return redirect(url_for('onboarding_interests_movies'))
-        else:
-            flash("Please select at least one music interest.")
+    done = wizard_step(parse_music, 'onboarding_interests_movies')
+    if done:
+        return done
     
-    saved_interests = user.interests_music.split(',') if user.interests_music else []
+    saved_interests = split_interests(draft_profile(user).interests_music)
     return render_template('onboarding_interests_music.html', 
-                           music_options=music_options, saved_interests=saved_interests, user=user)
+                           music_options=MUSIC_OPTIONS, saved_interests=saved_interests, user=user)
 
 @app.route('/onboarding/interests/movies', methods=['GET', 'POST'])
 def onboarding_interests_movies():
-    if 'user_id' not in session:
-        return redirect(url_for('landing'))
-    
-    user = User.query.get(session['user_id'])
+    user = g.user
     if not user:
         return redirect(url_for('landing'))
     
-    movie_options = [
-        'Action (Hero vibes only)',
-        'Comedy (LOL scenes)',
-        'Drama (Full filmy feels)',
-        'Fantasy (Magic & dhamaal)',
-        'Horror (Bhoot pret alert)',
-        'Mystery (Who\'s the culprit?)',
-        'Romance (Love-shove)',
-        'Thriller (Dil thamm ke dekho)',
-        'Sci-Fi (Space jugaad)',
-        'Documentary (Sach ka tadka)'
-    ]
-
-    if request.method == 'POST':
-        selected_movies = request.form.getlist('movie_interests')
-        if selected_movies:
-            user.interests_movies = ','.join(selected_movies)
-            db.session.commit()
-            return redirect(url_for('onboarding_interests_topics'))
-        else:
-            flash("Please select at least one movie interest.")
+    done = wizard_step(parse_movies, 'onboarding_interests_topics')
+    if done:
+        return done
     
-    saved_interests = user.interests_movies.split(',') if user.interests_movies else []
+    saved_interests = split_interests(draft_profile(user).interests_movies)
     return render_template('onboarding_interests_movies.html', 
-                           movie_options=movie_options, saved_interests=saved_interests, user=user)
+                           movie_options=MOVIE_OPTIONS, saved_interests=saved_interests, user=user)
 
 @app.route('/onboarding/interests/topics', methods=['GET', 'POST'])
 def onboarding_interests_topics():
-    if 'user_id' not in session:
-        return redirect(url_for('landing'))
-    
-    user = User.query.get(session['user_id'])
+    user = g.user
     if not user:
         return redirect(url_for('landing'))
     
-    topic_options = [
-        'Memes (Hasi ka dose)',
-        'Politics (Jhanda lehrayega?)',
-        'Lifestyle (Swag level)',
-        'Technology (Tech geek)',
-        'Gaming (Noob ya pro?)',
-        'Fitness (Gym-shim)',
-        'Books (Padhaku vibes)',
-        'Science (Rocket science?)',
-        'Travel (Yatra mode)',
-        'Food (Tandoori tadka)'
-    ]
-
-    if request.method == 'POST':
-        selected_topics = request.form.getlist('topic_interests')
-        if selected_topics:
-            user.interests_topics = ','.join(selected_topics)
-            db.session.commit()
-            return redirect(url_for('onboarding_review'))
-        else:
-            flash("Please select at least one topic interest.")
+    done = wizard_step(parse_topics, 'onboarding_review')
+    if done:
+        return done
     
-    saved_interests = user.interests_topics.split(',') if user.interests_topics else []
+    saved_interests = split_interests(draft_profile(user).interests_topics)
     return render_template('onboarding_interests_topics.html', 
-                           topic_options=topic_options, saved_interests=saved_interests, user=user)
+                           topic_options=TOPIC_OPTIONS, saved_interests=saved_interests, user=user)
 
-@app.route('/onboarding/review')
+@app.route('/onboarding/review', methods=['GET', 'POST'])
 def onboarding_review():
-    if 'user_id' not in session:
+    user = g.user
+    if not user:
         return redirect(url_for('landing'))
     
-    user = User.query.get(session['user_id'])
+    draft = draft_profile(user)
+    if request.method == 'POST':
+        # Re-run every step's checks; send the user back to the first that fails
+        form = draft_as_form(draft)
+        fields = {}
+        for endpoint, parse in ONBOARDING_STEPS:
+            parsed, error = parse(form)
+            if not parsed:
+                flash(error)
+                return redirect(url_for(endpoint))
+            fields.update(parsed)
+        complete_onboarding(user, fields)
+        return redirect(url_for('dashboard'))
+    
+    return render_template('onboarding_review.html', user=draft)
+
+@app.route('/onboarding', methods=['GET', 'POST'])
+def onboarding_single():
+    """Every onboarding question on one page, saved with a single POST"""
+    user = g.user
     if not user:
         return redirect(url_for('landing'))
     
-    return render_template('onboarding_review.html', user=user)
+    errors = []
+    if request.method == 'POST':
+        fields = {}
+        for parse in ONBOARDING_PARSERS:
+            parsed, error = parse(request.form)
+            if parsed:
+                fields.update(parsed)
+            else:
+                errors.append(error)
+        if not errors:
+            complete_onboarding(user, fields)
+            return redirect(url_for('dashboard'))
+        profile = draft_profile(user)._replace(**fields)
+    else:
+        profile = draft_profile(user)
+    
+    return render_template('onboarding_single.html', user=user, profile=profile, errors=errors,
+                           music_options=MUSIC_OPTIONS, movie_options=MOVIE_OPTIONS, topic_options=TOPIC_OPTIONS,
+                           saved_music=split_interests(profile.interests_music),
+                           saved_movies=split_interests(profile.interests_movies),
+                           saved_topics=split_interests(profile.interests_topics))
 
 # ---------------------- 👤 User Dashboard ----------------------
 
 @app.route('/dashboard')
 def dashboard():
-    if 'user_id' not in session:
-        return redirect(url_for('landing'))
-
-    user = User.query.get(session['user_id'])
+    user = g.user
     if not user:
         session.clear()
         return redirect(url_for('landing'))
 
-    if user.is_banned:
-        flash("You have been banned.")
-        session.clear()
-        return redirect(url_for('landing'))
-
     # Check if user has completed onboarding
     if not user.nickname or not user.age or not user.bio:
-        return redirect(url_for('onboarding_nickname'))
+        return redirect(onboarding_start())
 
-    # Fetch accepted matches
-    matches = db.session.query(Vibe).filter_by(sender=user.reddit_username, status='accepted').all()
+    # Fetch matches from either side together with the matched users in one query
+    matched_users = db.session.query(User).join(
+        Match,
+        ((Match.user_a_id == user.id) & (Match.user_b_id == User.id)) |
+        ((Match.user_b_id == user.id) & (Match.user_a_id == User.id))
+    ).order_by(Match.created_at.desc()).all()
+    
+    # Score every match in one batch
+    matches = list(zip(matched_users, batch_scores(user, matched_users)))
     
-    score = calculate_match_score(user, u)
     # Fetch pending incoming vibes
     incoming_vibes = db.session.query(Vibe).filter_by(receiver=user.reddit_username, status='pending').all()
 
-    return render_template('dashboard.html', user=user, matches=matches, pending_vibes=incoming_vibes)
+    return render_template('dashboard.html', user=user, matches=matches, pending_vibes=incoming_vibes,
+                           events_sse=EVENTS_SSE, events_poll_seconds=EVENTS_CLIENT_POLL_SECONDS)
 
 @app.route('/edit-profile', methods=['GET', 'POST'])
 def edit_profile():
-    if 'user_id' not in session:
-        return redirect(url_for('landing'))
-    
-    user = User.query.get(session['user_id'])
+    user = g.user
     if not user:
         return redirect(url_for('landing'))
     
@@ -467,8 +826,12 @@ def edit_profile():
             user.interests_music = ','.join(request.form.getlist('interests_music'))
             user.interests_movies = ','.join(request.form.getlist('interests_movies'))
             user.interests_topics = ','.join(request.form.getlist('interests_topics'))
+            sync_interest_masks(user)
             
+            queue_profile_refresh(user)
             db.session.commit()
+            interest_index.update(user)
+            forget_profile(user.id)
             flash("Profile updated successfully!")
             return redirect(url_for('dashboard'))
         except Exception as e:
@@ -480,94 +843,222 @@ def edit_profile():
 
 @app.route('/matches')
 def matches():
-    if 'user_id' not in session:
-        return redirect(url_for('landing'))
-    
-    user = User.query.get(session['user_id'])
+    user = g.user
     if not user:
         return redirect(url_for('landing'))
     
-    # Get users within age preference and exclude banned users
-    all_users = User.query.filter(
+    limit = request.args.get('limit', MATCHES_PAGE_SIZE, type=int)
+    limit = max(1, min(limit, MATCHES_MAX_PAGE_SIZE))
+    offset = max(0, request.args.get('offset', 0, type=int))
+    
+    # Repeated refreshes are served from the per-user cache
+    page = cached_matches_page(user.id, limit, offset)
+    if page is None:
+        page = load_matches_page(user, limit, offset)
+        store_matches_page(user.id, limit, offset, page)
+    suggestions, has_more = page
+    
+    return render_template('matches.html', suggestions=suggestions, user=user,
+                           limit=limit, offset=offset, has_more=has_more)
+
+def load_matches_page(user, limit, offset):
+    """Best-first (MatchCard, score) pairs for one page, plus whether more exist"""
+    # Precomputed suggestions: one indexed read on (user_id, rank)
+    stored = db.session.query(User, Suggestion.score).join(
+        Suggestion, Suggestion.candidate_id == User.id
+    ).filter(
+        Suggestion.user_id == user.id,
+        User.is_banned == False
+    ).order_by(Suggestion.rank).offset(offset).limit(limit + 1).all()
+    
+    # An empty page is final once the worker has computed the list
+    precomputed = bool(stored) or db.session.get(SuggestionList, user.id) is not None
+    if precomputed:
+        suggestions = [(MatchCard(u.id, u.reddit_username, u.nickname), score) for u, score in stored[:limit]]
+        has_more = len(stored) > limit
+    else:
+        # Nothing precomputed yet: score inline and ask the worker for a list
+        ranked, total = rank_matches(user, limit, offset)
+        page_ids = [row.id for row, _ in ranked]
+        page_users = {
+            u.id: u for u in User.query.filter(User.id.in_(page_ids), User.is_banned == False).all()
+        } if page_ids else {}
+        suggestions = [
+            (MatchCard(row.id, row.reddit_username, page_users[row.id].nickname), score)
+            for row, score in ranked if row.id in page_users
+        ]
+        has_more = offset + limit < total
+        queue_suggestion_refresh(user.id)
+        db.session.commit()
+    
+    return suggestions, has_more
+
+def cached_matches_page(user_id, limit, offset):
+    entry = matches_cache.get(user_id)
+    if entry is None or entry[0] != session.get('matches_version', 0):
+        return None
+    return entry[1].get((limit, offset))
+
+def store_matches_page(user_id, limit, offset, page):
+    if limit != MATCHES_PAGE_SIZE or offset % limit or offset >= limit * MATCHES_CACHED_PAGES:
+        return
+    entry = matches_cache.get(user_id)
+    version = session.get('matches_version', 0)
+    # Build a new dict rather than mutating one other threads may be reading
+    pages = dict(entry[1]) if entry is not None and entry[0] == version else {}
+    pages[(limit, offset)] = page
+    matches_cache.set(user_id, (version, pages))
+
+def invalidate_matches(*user_ids):
+    """Drop cached /matches pages for these users.
+
+    The cache is per process, so the signed-in user's session also carries a
+    version that makes other workers skip what they cached before the change.
+    """
+    for user_id in user_ids:
+        matches_cache.pop(user_id)
+    if has_request_context() and session.get('user_id') in user_ids:
+        session['matches_version'] = session.get('matches_version', 0) + 1
+
+def vibed_usernames(user):
+    """Everyone `user` has sent a vibe to, including vibes archived by compact-vibes"""
+    live = db.session.query(Vibe.receiver).filter_by(sender=user.reddit_username)
+    archived = db.session.query(VibeHistory.receiver).filter_by(sender=user.reddit_username)
+    return {row[0] for row in live.union_all(archived)}
+
+def match_candidates(user, needed):
+    """Scoring rows for everyone `user` could be shown, minus users already vibed"""
+    sent_usernames = vibed_usernames(user)
+    
+    # Start from users sharing at least one interest
+    interest_index.ensure_loaded(load_interest_index)
+    candidates = [
+        p for p in interest_index.candidates(user, user.preferred_age_min, user.preferred_age_max)
+        if p.reddit_username not in sent_usernames
+    ]
+    
+    # Too few overlaps: scan the whole age window instead
+    if len(candidates) < needed:
+        candidate_rows = db.session.query(*SCORING_COLUMNS).filter(
+            User.reddit_username != user.reddit_username,
+            User.is_banned == False,
+            User.age >= user.preferred_age_min,
+            User.age <= user.preferred_age_max,
+            User.nickname.isnot(None),  # Only show users who completed onboarding
+            User.bio.isnot(None)
+        ).all()
+        candidates = [row for row in candidate_rows if row.reddit_username not in sent_usernames]
+    
+    return candidates
+
+def rank_matches(user, limit, offset=0):
+    """Best-first (row, score) page for `user` plus the candidate count"""
+    if MATCH_SCORING_BACKEND == 'sql':
+        return rank_matches_sql(user, limit, offset)
+    
+    candidates = match_candidates(user, offset + limit)
+    # Pick the page with a partial selection instead of a full sort
+    return rank_candidates(user, candidates, limit, offset), len(candidates)
+
+def shared_interests_sql(column, mask):
+    """SQL count of the bits of `mask` that are also set in `column`"""
+    column = func.coalesce(column, 0)
+    bits = [1 << bit for bit in range(MASK_WIDTH) if mask >> bit & 1]
+    return sum((case((column.op('&')(bit) != 0, 1), else_=0) for bit in bits), literal(0))
+
+def jitter_sql(viewer_id, candidate_id):
+    """SQL version of scoring.seeded_jitter for the current time bucket"""
+    seed = jitter_seed(viewer_id, jitter_bucket())
+    return (candidate_id * JITTER_MULTIPLIER + seed) % (1 << 32) // 65536 % 21
+
+def rank_matches_sql(user, limit, offset=0):
+    """Same ranking as rank_matches, computed and paged inside the database"""
+    music, movies, topics, age = encode_profile(user)
+    
+    raw_score = 10 * (
+        shared_interests_sql(InterestMask.music, music) +
+        shared_interests_sql(InterestMask.movies, movies) +
+        shared_interests_sql(InterestMask.topics, topics)
+    ) + jitter_sql(user.id, User.id)
+    if user.age is not None:
+        age_diff = func.abs(User.age - age)
+        raw_score = raw_score + case((age_diff <= 2, 20), (age_diff <= 5, 10), (age_diff <= 10, 5), else_=0)
+    raw_score = raw_score.label('raw_score')
+    
+    # Anti-join instead of loading the sent vibes into Python
+    already_sent = db.session.query(Vibe.id).filter(
+        Vibe.sender == user.reddit_username,
+        Vibe.receiver == User.reddit_username
+    ).exists()
+    already_archived = db.session.query(VibeHistory.receiver).filter(
+        VibeHistory.sender == user.reddit_username,
+        VibeHistory.receiver == User.reddit_username
+    ).exists()
+    
+    rows = db.session.query(User.id, User.reddit_username, raw_score).outerjoin(
+        InterestMask, InterestMask.user_id == User.id
+    ).filter(
         User.reddit_username != user.reddit_username,
         User.is_banned == False,
         User.age >= user.preferred_age_min,
         User.age <= user.preferred_age_max,
         User.nickname.isnot(None),  # Only show users who completed onboarding
-        User.bio.isnot(None)
-    ).all()
-    
-    # Filter out users we've already sent vibes to
-    sent_vibes = db.session.query(Vibe.receiver).filter_by(sender=user.reddit_username).all()
-    sent_usernames = [vibe[0] for vibe in sent_vibes]
-    
-    suggestions = []
-    for u in all_users:
-        if u.reddit_username not in sent_usernames:
-            # Simple scoring based on common interests
-            score = calculate_match_score(user, u)
-            suggestions.append((u, score))
-    
-    # Sort by score descending
-    suggestions.sort(key=lambda x: x[1], reverse=True)
+        User.bio.isnot(None),
+        ~already_sent,
+        ~already_archived
+    ).order_by(raw_score.desc(), User.id).offset(offset).limit(limit + 1).all()
     
-    return render_template('matches.html', suggestions=suggestions, user=user)
+    ranked = [(row, round(row.raw_score / 3, 2)) for row in rows[:limit]]
+    return ranked, offset + len(rows)
 
 def calculate_match_score(user1, user2):
     """Calculate match score between two users based on common interests"""
-    score = 0
-    
-    # Music interests
-    if user1.interests_music and user2.interests_music:
-        music1 = set(user1.interests_music.split(','))
-        music2 = set(user2.interests_music.split(','))
-        score += len(music1.intersection(music2)) * 10
-    
-    # Movie interests
-    if user1.interests_movies and user2.interests_movies:
-        movies1 = set(user1.interests_movies.split(','))
-        movies2 = set(user2.interests_movies.split(','))
-        score += len(movies1.intersection(movies2)) * 10
-    
-    # Topic interests
-    if user1.interests_topics and user2.interests_topics:
-        topics1 = set(user1.interests_topics.split(','))
-        topics2 = set(user2.interests_topics.split(','))
-        score += len(topics1.intersection(topics2)) * 10
-    
-    # Age compatibility
-    age_diff = abs(user1.age - user2.age)
-    if age_diff <= 2:
-        score += 20
-    elif age_diff <= 5:
-        score += 10
-    elif age_diff <= 10:
-        score += 5
-    
-    # Add some randomness to prevent always showing same order
-    score += random.randint(0, 20)
-    
-    return round(score / 3, 2)
+    return batch_scores(user1, [user2])[0]
 
 @app.route('/send-vibe/<target_username>', methods=['POST'])
 def send_vibe(target_username):
-    if 'user_id' not in session:
-        return redirect(url_for('landing'))
-    
-    user = User.query.get(session['user_id'])
+    user = g.user
     if not user:
         return redirect(url_for('landing'))
     
-    # Check if vibe already exists
+    target = User.query.filter_by(reddit_username=target_username).first()
+    if not target:
+        flash("User not found.")
+        return redirect(url_for('matches'))
+    
+    # Check if vibe already exists, live or archived
     existing_vibe = Vibe.query.filter_by(
         sender=user.reddit_username, 
         receiver=target_username
-    ).first()
+    ).first() or db.session.get(VibeHistory, (user.reddit_username, target_username))
     
     if not existing_vibe:
-        vibe = Vibe(sender=user.reddit_username, receiver=target_username, status='pending')
+        vibe = Vibe(
+            sender=user.reddit_username,
+            receiver=target_username,
+            sender_id=user.id,
+            receiver_id=target.id,
+            status='pending'
+        )
         db.session.add(vibe)
-        db.session.commit()
+        publish_event(target.id, 'vibe_received', sender=user.reddit_username)
+        # Drop the receiver from the stored list right away, the worker refills it
+        Suggestion.query.filter_by(user_id=user.id, candidate_id=target.id).delete(synchronize_session=False)
+        queue_suggestion_refresh(user.id)
+        bump_stats({
+            ('vibes', ''): 1,
+            ('vibes_pending', ''): 1,
+            ('vibes_sent', hour_bucket(datetime.utcnow())): 1
+        })
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # A concurrent request sent the same vibe first
+            db.session.rollback()
+            flash("You've already sent a vibe to this user.")
+            return redirect(url_for('matches'))
+        invalidate_matches(user.id)
+        metrics.record_event('vibe_sent')
         flash(f"Vibe sent to {target_username}!")
     else:
         flash("You've already sent a vibe to this user.")
@@ -576,10 +1067,7 @@ def send_vibe(target_username):
 
 @app.route('/accept-vibe/<sender_username>', methods=['POST'])
 def accept_vibe(sender_username):
-    if 'user_id' not in session:
-        return redirect(url_for('landing'))
-    
-    user = User.query.get(session['user_id'])
+    user = g.user
     if not user:
         return redirect(url_for('landing'))
     
@@ -591,17 +1079,21 @@ def accept_vibe(sender_username):
     
     if vibe:
         vibe.status = 'accepted'
+        bump_stats({('vibes_pending', ''): -1, ('vibes_accepted', ''): 1})
+        sender_id = vibe.sender_id or db.session.query(User.id).filter_by(reddit_username=sender_username).scalar()
+        if sender_id:
+            user_a_id, user_b_id = match_pair(user.id, sender_id)
+            upsert(Match, [{'user_a_id': user_a_id, 'user_b_id': user_b_id, 'created_at': datetime.utcnow()}])
+            publish_event(sender_id, 'vibe_accepted', by=user.reddit_username)
         db.session.commit()
+        metrics.record_event('vibe_accepted')
         flash(f"You matched with {sender_username}!")
     
     return redirect(url_for('dashboard'))
 
 @app.route('/deny-vibe/<sender_username>', methods=['POST'])
 def deny_vibe(sender_username):
-    if 'user_id' not in session:
-        return redirect(url_for('landing'))
-    
-    user = User.query.get(session['user_id'])
+    user = g.user
     if not user:
         return redirect(url_for('landing'))
     
@@ -613,27 +1105,45 @@ def deny_vibe(sender_username):
     
     if vibe:
         vibe.status = 'denied'
+        bump_stats({('vibes_pending', ''): -1, ('vibes_denied', ''): 1})
         db.session.commit()
+        metrics.record_event('vibe_denied')
         flash(f"Vibe from {sender_username} denied.")
     
     return redirect(url_for('dashboard'))
 
 @app.route('/unmatch/<username>', methods=['POST'])
 def unmatch(username):
-    if 'user_id' not in session:
-        return redirect(url_for('landing'))
-    
-    user = User.query.get(session['user_id'])
+    user = g.user
     if not user:
         return redirect(url_for('landing'))
     
-    # Delete all vibes between the two users
-    Vibe.query.filter(
+    # Delete all vibes between the two users, archived ones included
+    between = Vibe.query.filter(
         ((Vibe.sender == user.reddit_username) & (Vibe.receiver == username)) |
         ((Vibe.sender == username) & (Vibe.receiver == user.reddit_username))
+    )
+    removed = dict(between.with_entities(Vibe.status, func.count()).group_by(Vibe.status).all())
+    between.delete()
+    archived = VibeHistory.query.filter(
+        ((VibeHistory.sender == user.reddit_username) & (VibeHistory.receiver == username)) |
+        ((VibeHistory.sender == username) & (VibeHistory.receiver == user.reddit_username))
     ).delete()
-    
+    deltas = {('vibes', ''): -sum(removed.values()), ('vibes_archived', ''): -archived}
+    for status, count in removed.items():
+        deltas[(f'vibes_{status}', '')] = -count
+    bump_stats(deltas)
+    
+    other_id = db.session.query(User.id).filter_by(reddit_username=username).scalar()
+    if other_id:
+        user_a_id, user_b_id = match_pair(user.id, other_id)
+        Match.query.filter_by(user_a_id=user_a_id, user_b_id=user_b_id).delete()
+        publish_event(other_id, 'unmatched', by=user.reddit_username)
+    
+    # Both users can be suggested to each other again
+    queue_suggestion_refresh(user.id, *([other_id] if other_id else []))
     db.session.commit()
+    invalidate_matches(user.id, *([other_id] if other_id else []))
     flash(f"Unmatched with {username}.")
     
     return redirect(url_for('dashboard'))
@@ -654,58 +1164,222 @@ def share_profile(username):
         flash("User not found.")
         return redirect(url_for('dashboard'))
     
-    return render_template('share_profile.html', user=user)
+    # Primary-key lookup on the ordered pair
+    is_match = False
+    viewer_id = session.get('user_id')
+    if viewer_id and viewer_id != user.id:
+        is_match = db.session.get(Match, match_pair(viewer_id, user.id)) is not None
+    
+    return render_template('share_profile.html', user=user, is_match=is_match)
+
+# ---------------------- 📡 Live Events ----------------------
+
+# Dashboards stream /events on gevent workers (GUNICORN_WORKER_CLASS=gevent,
+# as deployed by render.yaml), where an open stream costs a green thread.
+# Under gthread each stream would hold a worker thread, so dashboards poll
+# /events/recent instead. EVENTS_SSE=1/0 overrides the choice.
+EVENTS_SSE = os.environ.get(
+    'EVENTS_SSE', '1' if os.environ.get('GUNICORN_WORKER_CLASS') == 'gevent' else '0'
+).lower() in ('1', 'true', 'yes')
+# Seconds between dashboard polls when SSE is off
+EVENTS_CLIENT_POLL_SECONDS = int(os.environ.get('EVENTS_CLIENT_POLL_SECONDS', 20))
+# Seconds between polls of the events table, per process
+EVENTS_POLL_INTERVAL = float(os.environ.get('EVENTS_POLL_INTERVAL', 1.0))
+# Comment lines sent on idle streams so proxies keep them open
+EVENTS_HEARTBEAT = float(os.environ.get('EVENTS_HEARTBEAT', 15))
+# Streams are closed after this long; the browser reconnects with Last-Event-ID
+EVENTS_STREAM_SECONDS = float(os.environ.get('EVENTS_STREAM_SECONDS', 300))
+# Open streams allowed per process. Each holds a worker thread under gthread
+# but only a green thread under gevent.
+EVENTS_MAX_STREAMS = int(os.environ.get(
+    'EVENTS_MAX_STREAMS', 1000 if os.environ.get('GUNICORN_WORKER_CLASS') == 'gevent' else 4
+))
+# How long published events are kept for reconnecting streams
+EVENTS_RETENTION = timedelta(minutes=int(os.environ.get('EVENTS_RETENTION_MINUTES', 10)))
+
+event_broker = EventBroker(poll_interval=EVENTS_POLL_INTERVAL)
+_events_pruned_at = 0.0
+
+def publish_event(user_id, kind, **data):
+    """Queue an event for `user_id`; it is delivered once the current transaction commits"""
+    db.session.add(Event(user_id=user_id, kind=kind, payload=json.dumps(data)))
+
+def as_stream_event(row):
+    return StreamEvent(row.id, row.user_id, row.kind, row.payload)
+
+def latest_event_id():
+    with app.app_context():
+        return db.session.query(func.max(Event.id)).scalar() or 0
+
+def poll_events(after_id):
+    """Events newer than `after_id` for the broker, pruning expired ones now and then"""
+    global _events_pruned_at
+    with app.app_context():
+        if time.monotonic() - _events_pruned_at > 60:
+            _events_pruned_at = time.monotonic()
+            Event.query.filter(Event.created_at < datetime.utcnow() - EVENTS_RETENTION).delete()
+            db.session.commit()
+        rows = Event.query.filter(Event.id > after_id).order_by(Event.id).limit(1000).all()
+        return [as_stream_event(row) for row in rows]
+
+def format_sse(event):
+    return f"id: {event.id}\nevent: {event.kind}\ndata: {event.data}\n\n"
+
+@app.route('/events')
+def events_stream():
+    """Server-Sent Events for the signed-in user: vibe_received, vibe_accepted, unmatched"""
+    user = g.user
+    if not user:
+        return Response(status=401)
+    if not EVENTS_SSE:
+        return Response(status=404)
+    if event_broker.streams >= EVENTS_MAX_STREAMS:
+        return Response(status=503, headers={'Retry-After': '30'})
+    
+    user_id = user.id
+    last_id = request.headers.get('Last-Event-ID', type=int)
+    subscription = event_broker.subscribe(user_id, poll_events, latest_event_id)
+    # Replay what a reconnecting browser missed; the subscription is already
+    # open, so anything newer arrives through it and duplicates are skipped
+    backlog = []
+    if last_id is not None:
+        backlog = [as_stream_event(row) for row in Event.query.filter(
+            Event.user_id == user_id, Event.id > last_id
+        ).order_by(Event.id).all()]
+    
+    # Runs after the request context is gone, so it must not touch the database
+    def stream():
+        seen = last_id or 0
+        try:
+            yield "retry: 5000\n\n"
+            for event in backlog:
+                seen = event.id
+                yield format_sse(event)
+            deadline = time.monotonic() + EVENTS_STREAM_SECONDS
+            while time.monotonic() < deadline:
+                event = subscription.get(timeout=EVENTS_HEARTBEAT)
+                if event is None:
+                    yield ": keep-alive\n\n"
+                elif event is OVERFLOW:
+                    break
+                elif event.id > seen:
+                    seen = event.id
+                    yield format_sse(event)
+        finally:
+            event_broker.unsubscribe(subscription)
+    
+    return Response(stream(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@app.route('/events/recent')
+def events_recent():
+    """Events after ?after=<id> for dashboards that poll; without it, just the id to poll from"""
+    user = g.user
+    if not user:
+        return Response(status=401)
+    
+    after = request.args.get('after', type=int)
+    events = []
+    if after is None:
+        last_id = db.session.query(func.max(Event.id)).filter(Event.user_id == user.id).scalar() or 0
+    else:
+        rows = Event.query.filter(Event.user_id == user.id, Event.id > after).order_by(Event.id).limit(100).all()
+        events = [{'id': row.id, 'kind': row.kind, 'data': row.payload} for row in rows]
+        last_id = rows[-1].id if rows else after
+    return {'last_id': last_id, 'events': events}
 
 # ---------------------- 🛠️ Admin Panel ----------------------
 
 @app.route('/admin')
 def admin_panel():
-    if 'user_id' not in session:
-        return redirect(url_for('landing'))
-
-    user = User.query.get(session['user_id'])
+    user = g.user
     if not user or user.reddit_username != ADMIN_USERNAME:
         flash("Access denied.")
         return redirect(url_for('dashboard'))
 
-    ist = timezone('Asia/Kolkata')
-    users = User.query.order_by(User.joined.desc()).all()
-    for u in users:
-        u.joined_ist = u.joined.replace(tzinfo=timezone('UTC')).astimezone(ist)
-    
-    return render_template('admin_dashboard.html', users=users)
+    per_page = request.args.get('per_page', ADMIN_PAGE_SIZE, type=int)
+    per_page = max(1, min(per_page, ADMIN_MAX_PAGE_SIZE))
+    search = request.args.get('q', '').strip()
+    
+    # Only the listed columns, with the IST conversion done by the database
+    query = db.session.query(
+        User.id,
+        User.reddit_username,
+        User.joined,
+        to_admin_timezone_sql(User.joined).label('joined_ist'),
+        User.account_age,
+        User.karma,
+        User.is_banned
+    )
+    if search:
+        query = query.filter(User.reddit_username.startswith(search, autoescape=True))
+    
+    # Keyset pagination on (joined, id), newest first. Imported users may
+    # have no join date; they come last and the cursor marks them 'none'.
+    after_id = request.args.get('after_id', type=int)
+    after_joined = request.args.get('after_joined', '')
+    if after_id is not None and after_joined == 'none':
+        query = query.filter(User.joined.is_(None), User.id < after_id)
+    elif after_id is not None:
+        try:
+            after_joined = datetime.fromisoformat(after_joined)
+        except ValueError:
+            after_id = None
+        else:
+            query = query.filter(
+                (User.joined < after_joined) |
+                ((User.joined == after_joined) & (User.id < after_id)) |
+                User.joined.is_(None)
+            )
+    
+    rows = query.order_by(User.joined.desc().nulls_last(), User.id.desc()).limit(per_page + 1).all()
+    users = rows[:per_page]
+    next_page = None
+    if len(rows) > per_page:
+        last = users[-1]
+        next_page = {'after_joined': last.joined.isoformat() if last.joined else 'none', 'after_id': last.id}
+    
+    return render_template('admin_dashboard.html', users=users, search=search,
+                           per_page=per_page, next_page=next_page,
+                           is_first_page=after_id is None)
+
+def to_admin_timezone_sql(column):
+    """SQL expression turning a naive UTC datetime column into ADMIN_TIMEZONE local time"""
+    if db.session.get_bind().dialect.name == 'postgresql':
+        return func.timezone(ADMIN_TIMEZONE.zone, func.timezone('UTC', column))
+    # SQLite has no zone database, but Asia/Kolkata keeps a fixed offset
+    offset = ADMIN_TIMEZONE.utcoffset(datetime.utcnow())
+    minutes = int(offset.total_seconds() // 60)
+    return type_coerce(func.datetime(column, f'{minutes:+d} minutes'), db.DateTime)
 
 @app.route('/admin/reports')
 def admin_reports():
-    if 'user_id' not in session:
-        return redirect(url_for('landing'))
-
-    user = User.query.get(session['user_id'])
+    user = g.user
     if not user or user.reddit_username != ADMIN_USERNAME:
         flash("Access denied.")
         return redirect(url_for('dashboard'))
 
-    # Get some basic stats
-    total_users = User.query.count()
-    total_vibes = Vibe.query.count()
-    pending_vibes = Vibe.query.filter_by(status='pending').count()
-    accepted_vibes = Vibe.query.filter_by(status='accepted').count()
+    # Get some basic stats from the maintained counters
+    totals, series = read_stats()
     
     stats = {
-        'total_users': total_users,
-        'total_vibes': total_vibes,
-        'pending_vibes': pending_vibes,
-        'accepted_vibes': accepted_vibes
+        'total_users': totals.get('users', 0),
+        'total_vibes': totals.get('vibes', 0),
+        'pending_vibes': totals.get('vibes_pending', 0),
+        'accepted_vibes': totals.get('vibes_accepted', 0),
+        'denied_vibes': totals.get('vibes_denied', 0),
+        'archived_vibes': totals.get('vibes_archived', 0),
+        'signups_per_day': sorted(series['signups'].items(), reverse=True),
+        'vibes_per_hour': sorted(series['vibes_sent'].items(), reverse=True)
     }
     
     return render_template('reports.html', stats=stats)
 
 @app.route('/admin/ban/<username>')
 def admin_ban(username):
-    if 'user_id' not in session:
-        return redirect(url_for('landing'))
-
-    user = User.query.get(session['user_id'])
+    user = g.user
     if not user or user.reddit_username != ADMIN_USERNAME:
         flash("Access denied.")
         return redirect(url_for('dashboard'))
@@ -713,7 +1387,10 @@ def admin_ban(username):
     target_user = User.query.filter_by(reddit_username=username).first()
     if target_user:
         target_user.is_banned = not target_user.is_banned
+        queue_profile_refresh(target_user)
         db.session.commit()
+        interest_index.update(target_user)
+        forget_profile(target_user.id)
         status = "banned" if target_user.is_banned else "unbanned"
         flash(f"User {username} has been {status}.")
     else:
@@ -721,6 +1398,589 @@ def admin_ban(username):
     
     return redirect(url_for('admin_panel'))
 
+# ---------------------- 🧮 Suggestions Worker ----------------------
+
+def queue_suggestion_refresh(*user_ids):
+    """Mark users whose stored suggestions need recomputing (in the current transaction)"""
+    now = datetime.utcnow()
+    upsert(SuggestionRefresh, [{'user_id': user_id, 'requested_at': now} for user_id in set(user_ids)])
+
+def queue_profile_refresh(user):
+    """Queue `user` and everyone whose stored list contains them.
+
+    Users who could newly be shown `user` are not queued here, which would
+    fan out to most of the table on every signup; the worker's
+    --max-age-minutes re-queue picks them up instead.
+    """
+    listed_by = [row[0] for row in db.session.query(Suggestion.user_id).filter_by(candidate_id=user.id)]
+    queue_suggestion_refresh(user.id, *listed_by)
+    invalidate_matches(user.id, *listed_by)
+
+def queue_stale_suggestions(max_age_minutes, shard=0, shards=1, limit=100):
+    """Queue users whose stored list was computed more than `max_age_minutes` ago"""
+    cutoff = datetime.utcnow() - timedelta(minutes=max_age_minutes)
+    stale = [row[0] for row in db.session.query(SuggestionList.user_id).outerjoin(
+        SuggestionRefresh, SuggestionRefresh.user_id == SuggestionList.user_id
+    ).filter(
+        SuggestionRefresh.user_id == None,
+        (SuggestionList.user_id % shards) == shard,
+        SuggestionList.computed_at < cutoff
+    ).order_by(SuggestionList.computed_at).limit(limit)]
+    queue_suggestion_refresh(*stale)
+    db.session.commit()
+    return len(stale)
+
+def refresh_user_suggestions(user, top_n=SUGGESTIONS_TOP_N):
+    """Replace the stored top-N suggestions for one user"""
+    Suggestion.query.filter_by(user_id=user.id).delete(synchronize_session=False)
+    upsert(SuggestionList, [{'user_id': user.id, 'computed_at': datetime.utcnow()}])
+    
+    eligible = (
+        not user.is_banned and user.age is not None and
+        user.preferred_age_min is not None and user.preferred_age_max is not None
+    )
+    if not eligible:
+        return 0
+    
+    ranked, _ = rank_matches(user, top_n)
+    now = datetime.utcnow()
+    rows = [
+        {'user_id': user.id, 'candidate_id': row.id, 'rank': rank, 'score': score, 'computed_at': now}
+        for rank, (row, score) in enumerate(ranked)
+    ]
+    if rows:
+        db.session.execute(db.insert(Suggestion), rows)
+    return len(rows)
+
+def process_suggestion_queue(shard=0, shards=1, batch_size=100):
+    """Refresh one batch of queued users belonging to this shard"""
+    queued = SuggestionRefresh.query.filter(
+        (SuggestionRefresh.user_id % shards) == shard
+    ).order_by(SuggestionRefresh.requested_at).limit(batch_size).all()
+    if not queued:
+        return 0
+    
+    interest_index.ensure_loaded(load_interest_index)
+    users = {u.id: u for u in User.query.filter(User.id.in_([q.user_id for q in queued])).all()}
+    for u in users.values():
+        interest_index.update(u)
+    
+    for entry in queued:
+        user = users.get(entry.user_id)
+        if user:
+            refresh_user_suggestions(user)
+        else:
+            Suggestion.query.filter_by(user_id=entry.user_id).delete(synchronize_session=False)
+            SuggestionList.query.filter_by(user_id=entry.user_id).delete(synchronize_session=False)
+    
+    # Keep entries that were queued again while this batch was running
+    for entry in queued:
+        SuggestionRefresh.query.filter(
+            SuggestionRefresh.user_id == entry.user_id,
+            SuggestionRefresh.requested_at <= entry.requested_at
+        ).delete(synchronize_session=False)
+    
+    db.session.commit()
+    return len(queued)
+
+@app.cli.command('refresh-suggestions')
+@click.option('--all', 'refresh_all', is_flag=True, help='Rebuild every user in this shard first.')
+@click.option('--shard', default=0, help='Index of this worker process.')
+@click.option('--shards', default=1, help='Total number of worker processes.')
+@click.option('--batch-size', default=100, help='Users refreshed per transaction.')
+@click.option('--loop', is_flag=True, help='Keep polling the refresh queue.')
+@click.option('--interval', default=5.0, help='Seconds to sleep when the queue is empty.')
+@click.option('--max-age-minutes', default=SUGGESTIONS_MAX_AGE_MINUTES,
+              help='With --loop, also recompute lists older than this.')
+def refresh_suggestions_command(refresh_all, shard, shards, batch_size, loop, interval, max_age_minutes):
+    """Recompute stored match suggestions.
+
+    Run several processes with the same --shards and distinct --shard
+    values to split users by id.
+    """
+    if not 0 <= shard < shards:
+        raise click.BadParameter('--shard must be between 0 and --shards - 1')
+    
+    if refresh_all:
+        interest_index.ensure_loaded(load_interest_index)
+        last_id = 0
+        total = 0
+        while True:
+            users = User.query.filter(
+                User.id > last_id,
+                (User.id % shards) == shard
+            ).order_by(User.id).limit(batch_size).all()
+            if not users:
+                break
+            for u in users:
+                refresh_user_suggestions(u)
+            db.session.commit()
+            last_id = users[-1].id
+            total += len(users)
+        click.echo(f"Rebuilt suggestions for {total} users (shard {shard}/{shards})")
+    
+    while True:
+        done = process_suggestion_queue(shard, shards, batch_size)
+        if done:
+            click.echo(f"Refreshed suggestions for {done} queued users")
+        elif loop:
+            # Nothing queued: pick up lists that have gone stale meanwhile
+            if not queue_stale_suggestions(max_age_minutes, shard, shards, batch_size):
+                time.sleep(interval)
+        else:
+            break
+
+def backfill_interest_masks(batch_size=500, echo=click.echo):
+    last_id = 0
+    total = 0
+    while True:
+        users = User.query.filter(User.id > last_id).order_by(User.id).limit(batch_size).all()
+        if not users:
+            break
+        rows = []
+        for u in users:
+            music, movies, topics, _ = encode_profile(u)
+            rows.append({'user_id': u.id, 'music': music, 'movies': movies, 'topics': topics})
+        upsert(InterestMask, rows)
+        db.session.commit()
+        last_id = users[-1].id
+        total += len(users)
+        echo(f"Backfilled interest masks for {total} users")
+
+@app.cli.command('backfill-interest-masks')
+@click.option('--batch-size', default=500, help='Users written per transaction.')
+def backfill_interest_masks_command(batch_size):
+    """Fill interest_masks from the interest strings of every user"""
+    backfill_interest_masks(batch_size)
+
+# ---------------------- 🗄️ Migrations ----------------------
+
+# Rank used to pick which duplicate (sender, receiver) row survives
+VIBE_STATUS_PRIORITY = {'accepted': 0, 'pending': 1, 'denied': 2}
+
+def migrate_vibes_schema(engine, batch_size=1000, echo=click.echo):
+    """Add user-id columns and indexes to a vibe table and backfill the ids.
+
+    Works on the app schema (users/vibes) and on the older models.py schema
+    (user/vibe) used by the instances/*.db files. Safe to run repeatedly.
+    """
+    inspector = inspect(engine)
+    tables = inspector.get_table_names()
+    user_table = 'users' if 'users' in tables else 'user'
+    vibe_table = 'vibes' if 'vibes' in tables else 'vibe'
+    if user_table not in tables or vibe_table not in tables:
+        echo(f"{engine.url}: no user/vibe tables, skipping")
+        return
+    
+    quote = engine.dialect.identifier_preparer.quote
+    users, vibes = quote(user_table), quote(vibe_table)
+    columns = {column['name'] for column in inspector.get_columns(vibe_table)}
+    
+    with engine.begin() as conn:
+        for column in ('sender_id', 'receiver_id'):
+            if column not in columns:
+                conn.execute(text(f"ALTER TABLE {vibes} ADD COLUMN {column} INTEGER REFERENCES {users} (id)"))
+                echo(f"{vibe_table}: added {column}")
+        
+        # The unique (sender, receiver) index needs duplicates gone first
+        duplicates = conn.execute(text(
+            f"SELECT sender, receiver FROM {vibes} GROUP BY sender, receiver HAVING COUNT(*) > 1"
+        )).all()
+        removed = 0
+        for sender, receiver in duplicates:
+            rows = conn.execute(text(
+                f"SELECT id, status FROM {vibes} WHERE sender = :sender AND receiver = :receiver"
+            ), {'sender': sender, 'receiver': receiver}).all()
+            rows.sort(key=lambda row: (VIBE_STATUS_PRIORITY.get(row.status, 3), row.id))
+            for row in rows[1:]:
+                conn.execute(text(f"DELETE FROM {vibes} WHERE id = :id"), {'id': row.id})
+                removed += 1
+        if removed:
+            echo(f"{vibe_table}: removed {removed} duplicate vibes")
+    
+    # Backfill in id ranges so no single statement holds the table for long
+    with engine.connect() as conn:
+        max_id = conn.execute(text(f"SELECT MAX(id) FROM {vibes}")).scalar() or 0
+    filled = 0
+    for low in range(0, max_id, batch_size):
+        with engine.begin() as conn:
+            for column, name_column in (('sender_id', 'sender'), ('receiver_id', 'receiver')):
+                result = conn.execute(text(
+                    f"UPDATE {vibes} SET {column} = "
+                    f"(SELECT u.id FROM {users} u WHERE u.reddit_username = {vibes}.{name_column}) "
+                    f"WHERE {column} IS NULL AND id > :low AND id <= :high "
+                    f"AND {name_column} IN (SELECT reddit_username FROM {users})"
+                ), {'low': low, 'high': low + batch_size})
+                filled += result.rowcount
+    echo(f"{vibe_table}: backfilled {filled} user ids")
+    
+    with engine.begin() as conn:
+        for name, unique, cols in (
+            (f'ix_{vibe_table}_sender_status', False, 'sender, status'),
+            (f'ix_{vibe_table}_receiver_status', False, 'receiver, status'),
+            (f'uq_{vibe_table}_sender_receiver', True, 'sender, receiver'),
+            (f'ix_{vibe_table}_sender_id', False, 'sender_id'),
+            (f'ix_{vibe_table}_receiver_id', False, 'receiver_id'),
+        ):
+            kind = 'UNIQUE INDEX' if unique else 'INDEX'
+            conn.execute(text(f"CREATE {kind} IF NOT EXISTS {name} ON {vibes} ({cols})"))
+    echo(f"{vibe_table}: indexes in place")
+
+@app.cli.command('migrate-vibes')
+@click.option('--database', 'urls', multiple=True,
+              help='Database URL to migrate instead of DATABASE_URL, e.g. sqlite:///instances/vibe.db. Repeatable.')
+@click.option('--batch-size', default=1000, help='Vibe ids backfilled per transaction.')
+def migrate_vibes_command(urls, batch_size):
+    """Add vibe user-id foreign keys and indexes, backfilling existing rows"""
+    if not urls:
+        migrate_vibes_schema(db.engine, batch_size)
+        return
+    for url in urls:
+        engine = create_engine(url)
+        try:
+            migrate_vibes_schema(engine, batch_size)
+        finally:
+            engine.dispose()
+
+def backfill_matches(batch_size=1000, echo=click.echo):
+    last_id = 0
+    total = 0
+    while True:
+        vibes = Vibe.query.filter(
+            Vibe.id > last_id,
+            Vibe.status == 'accepted'
+        ).order_by(Vibe.id).limit(batch_size).all()
+        if not vibes:
+            break
+        ids = dict(db.session.query(User.reddit_username, User.id).filter(
+            User.reddit_username.in_({v.sender for v in vibes} | {v.receiver for v in vibes})
+        ).all())
+        rows = {}
+        for v in vibes:
+            sender_id = v.sender_id or ids.get(v.sender)
+            receiver_id = v.receiver_id or ids.get(v.receiver)
+            if sender_id and receiver_id:
+                pair = match_pair(sender_id, receiver_id)
+                rows[pair] = {'user_a_id': pair[0], 'user_b_id': pair[1], 'created_at': v.created_at}
+        upsert(Match, list(rows.values()))
+        db.session.commit()
+        last_id = vibes[-1].id
+        total += len(rows)
+    echo(f"Backfilled {total} matches")
+
+@app.cli.command('backfill-matches')
+@click.option('--batch-size', default=1000, help='Accepted vibes read per transaction.')
+def backfill_matches_command(batch_size):
+    """Fill the matches table from accepted vibes"""
+    backfill_matches(batch_size)
+
+def recount_stats(echo=click.echo):
+    deltas = {('users', ''): 0, ('vibes', ''): 0}
+    for (joined,) in db.session.query(User.joined).yield_per(1000):
+        deltas[('users', '')] += 1
+        if joined:
+            key = ('signups', day_bucket(joined))
+            deltas[key] = deltas.get(key, 0) + 1
+    for status, created_at in db.session.query(Vibe.status, Vibe.created_at).yield_per(1000):
+        deltas[('vibes', '')] += 1
+        key = (f'vibes_{status}', '')
+        deltas[key] = deltas.get(key, 0) + 1
+        if created_at:
+            key = ('vibes_sent', hour_bucket(created_at))
+            deltas[key] = deltas.get(key, 0) + 1
+    deltas[('vibes_archived', '')] = db.session.query(func.count()).select_from(VibeHistory).scalar()
+    
+    Stat.query.delete()
+    db.session.add_all(Stat(name=name, bucket=bucket, value=value) for (name, bucket), value in deltas.items())
+    db.session.commit()
+    echo(f"Recounted {len(deltas)} stats counters")
+
+@app.cli.command('recount-stats')
+def recount_stats_command():
+    """Rebuild the stats counters from the users, vibes and vibe_history tables"""
+    recount_stats()
+
+def create_users_joined_index():
+    # create_all skips indexes of tables that already exist
+    with db.engine.begin() as conn:
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_users_joined_id ON users (joined, id)"))
+
+def create_users_joined_desc_index():
+    # PostgreSQL can't scan (joined, id) as joined DESC NULLS LAST; SQLite
+    # sorts NULLs first, so the existing index already reads in that order
+    if db.engine.dialect.name == 'postgresql':
+        with db.engine.begin() as conn:
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_users_joined_desc_id ON users (joined DESC NULLS LAST, id DESC)"
+            ))
+
+def create_suggestion_lists():
+    SuggestionList.__table__.create(db.engine, checkfirst=True)
+    # Lists stored before this table existed count as computed
+    with db.engine.begin() as conn:
+        conn.execute(text(
+            "INSERT INTO suggestion_lists (user_id, computed_at) "
+            "SELECT user_id, MAX(computed_at) FROM suggestions "
+            "WHERE computed_at IS NOT NULL AND user_id NOT IN (SELECT user_id FROM suggestion_lists) "
+            "GROUP BY user_id"
+        ))
+
+# Ordered schema history. Append new entries, never edit applied ones; each
+# step must be safe on databases that already have its changes.
+SCHEMA_MIGRATIONS = [
+    (1, 'Create tables', lambda echo: db.create_all()),
+    (2, 'Vibe user ids and indexes', lambda echo: migrate_vibes_schema(db.engine, echo=echo)),
+    (3, 'Interest masks for existing users', lambda echo: backfill_interest_masks(echo=echo)),
+    (4, 'Matches from accepted vibes', lambda echo: backfill_matches(echo=echo)),
+    (5, 'Stats counters', lambda echo: recount_stats(echo=echo)),
+    (6, 'Event stream table', lambda echo: Event.__table__.create(db.engine, checkfirst=True)),
+    (7, 'Vibe history table', lambda echo: VibeHistory.__table__.create(db.engine, checkfirst=True)),
+    (8, 'Admin list index on users (joined, id)', lambda echo: create_users_joined_index()),
+    (9, 'Suggestion list computed times', lambda echo: create_suggestion_lists()),
+    (10, 'Admin list index matching its NULLS LAST order', lambda echo: create_users_joined_desc_index()),
+]
+
+def applied_migrations():
+    """Versions recorded in schema_migrations, empty before the first upgrade"""
+    if not inspect(db.engine).has_table(SchemaMigration.__tablename__):
+        return set()
+    return {version for (version,) in db.session.query(SchemaMigration.version)}
+
+def upgrade_schema(echo=click.echo):
+    """Apply every pending migration in order; returns how many ran"""
+    SchemaMigration.__table__.create(db.engine, checkfirst=True)
+    applied = applied_migrations()
+    ran = 0
+    for version, description, migrate in SCHEMA_MIGRATIONS:
+        if version in applied:
+            continue
+        echo(f"Applying {version}: {description}")
+        migrate(echo)
+        db.session.add(SchemaMigration(version=version, description=description))
+        db.session.commit()
+        ran += 1
+    return ran
+
+db_cli = AppGroup('db', help='Versioned schema migrations.')
+
+@db_cli.command('upgrade')
+def db_upgrade_command():
+    """Bring the schema up to the latest version"""
+    ran = upgrade_schema()
+    click.echo(f"Applied {ran} migrations" if ran else "Schema is up to date")
+
+@db_cli.command('current')
+def db_current_command():
+    """Show the latest applied version"""
+    applied = applied_migrations()
+    click.echo(max(applied) if applied else "No migrations applied")
+
+@db_cli.command('history')
+def db_history_command():
+    """List every migration and whether it has been applied"""
+    applied = applied_migrations()
+    for version, description, _ in SCHEMA_MIGRATIONS:
+        click.echo(f"{'x' if version in applied else ' '} {version:>3}  {description}")
+
+app.cli.add_command(db_cli)
+
+def mark_karma_refreshed(*user_ids):
+    now = datetime.utcnow()
+    upsert(KarmaRefresh, [{'user_id': user_id, 'refreshed_at': now} for user_id in user_ids])
+
+def refresh_karma_batch(batch_size, rate, max_age_hours):
+    """Refresh the stalest users from Reddit, at most `rate` calls per second.
+
+    Returns (users refreshed, whether Reddit asked us to back off).
+    """
+    cutoff = datetime.utcnow() - timedelta(hours=max_age_hours)
+    stale = db.session.query(User).outerjoin(
+        KarmaRefresh, KarmaRefresh.user_id == User.id
+    ).filter(
+        User.is_banned == False,
+        (KarmaRefresh.refreshed_at == None) | (KarmaRefresh.refreshed_at < cutoff)
+    ).order_by(KarmaRefresh.refreshed_at.is_(None).desc(), KarmaRefresh.refreshed_at).limit(batch_size).all()
+    
+    refreshed = []
+    throttled = False
+    for u in stale:
+        started = time.monotonic()
+        try:
+            response = metrics.reddit_call('about', reddit.about_user, u.reddit_username)
+        except requests.exceptions.RequestException as e:
+            click.echo(f"Karma refresh for {u.reddit_username} failed: {e}")
+            continue
+        
+        if response.status_code == 429:
+            throttled = True
+            break
+        if response.status_code == 200:
+            u.account_age, u.karma = reddit.account_stats(response.json().get('data', {}))
+        # Deleted or suspended accounts keep their last values until the next window
+        refreshed.append(u.id)
+        
+        # Spread calls out to stay inside the rate budget
+        time.sleep(max(0.0, 1.0 / rate - (time.monotonic() - started)))
+    
+    mark_karma_refreshed(*refreshed)
+    db.session.commit()
+    for user_id in refreshed:
+        forget_profile(user_id)
+    return len(refreshed), throttled
+
+@app.cli.command('refresh-karma')
+@click.option('--batch-size', default=50, help='Users refreshed per transaction.')
+@click.option('--rate', default=1.0, help='Maximum Reddit calls per second.')
+@click.option('--max-age-hours', default=KARMA_MAX_AGE_HOURS, help='Refresh users older than this.')
+@click.option('--loop', is_flag=True, help='Keep refreshing as users go stale.')
+@click.option('--interval', default=60.0, help='Seconds to sleep when nobody is stale.')
+def refresh_karma_command(batch_size, rate, max_age_hours, loop, interval):
+    """Refresh account age and karma from Reddit for stale users"""
+    while True:
+        done, throttled = refresh_karma_batch(batch_size, rate, max_age_hours)
+        if done:
+            click.echo(f"Refreshed karma for {done} users")
+        if throttled:
+            click.echo("Reddit is rate limiting us, backing off")
+            time.sleep(interval)
+        elif not done:
+            if not loop:
+                break
+            time.sleep(interval)
+
+# ---------------------- 📦 Export & Import ----------------------
+
+data_cli = AppGroup('data', help='Stream users and vibes between databases as JSON lines.')
+
+@data_cli.command('export')
+@click.argument('path', default='-')
+@click.option('--database', 'url', help='Database URL to read instead of DATABASE_URL, e.g. sqlite:///instances/vibe.db.')
+@click.option('--batch-size', default=1000, help='Rows read per query.')
+def data_export_command(path, url, batch_size):
+    """Write every user and vibe to PATH (stdout by default, gzipped for *.gz)"""
+    try:
+        out = transfer.open_dump(path, 'w')
+    except OSError as e:
+        raise click.ClickException(str(e))
+    engine = create_engine(url) if url else db.engine
+    try:
+        # Progress goes to stderr so the export can be piped
+        written = transfer.export_rows(engine, out, batch_size, echo=lambda message: click.echo(message, err=True))
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    except SQLAlchemyError as e:
+        raise click.ClickException(f"Export failed: {transfer.describe_error(e)}") from None
+    finally:
+        if out is not sys.stdout:
+            out.close()
+        if url:
+            engine.dispose()
+    click.echo(f"Exported {written['users']} users and {written['vibes']} vibes", err=True)
+
+@data_cli.command('import')
+@click.argument('path', default='-')
+@click.option('--database', 'url', help='Database URL to load instead of DATABASE_URL.')
+@click.option('--batch-size', default=1000, help='Rows written per transaction.')
+@click.option('--skip-existing', is_flag=True, help='Skip rows whose id is already present, e.g. to resume.')
+@click.option('--no-copy', is_flag=True, help='Use batched INSERTs instead of COPY on PostgreSQL.')
+def data_import_command(path, url, batch_size, skip_existing, no_copy):
+    """Load users and vibes from an export at PATH (stdin by default)"""
+    try:
+        lines = transfer.open_dump(path, 'r')
+    except OSError as e:
+        raise click.ClickException(str(e))
+    engine = create_engine(url) if url else db.engine
+    try:
+        loaded = transfer.import_rows(engine, lines, batch_size, skip_existing, not no_copy, echo=click.echo)
+    except transfer.BatchFailed as e:
+        raise click.ClickException(
+            f"{e}\nEarlier batches were committed. Rerun with --skip-existing to resume, "
+            f"or to load into a database that already has some of these rows."
+        )
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    except SQLAlchemyError as e:
+        raise click.ClickException(f"Import failed: {transfer.describe_error(e)}") from None
+    finally:
+        if lines is not sys.stdin:
+            lines.close()
+        if url:
+            engine.dispose()
+    verb = "Read" if skip_existing else "Imported"
+    click.echo(f"{verb} {loaded['users']} users and {loaded['vibes']} vibes")
+    
+    # Derived tables of the app database are rebuilt from what was loaded
+    if not url and transfer.detect_schema(db.engine) == 'app':
+        backfill_interest_masks()
+        backfill_matches()
+        recount_stats()
+        click.echo("Run `flask refresh-suggestions --all` to rebuild stored suggestions")
+
+app.cli.add_command(data_cli)
+
+# ---------------------- 🧹 Vibe Retention ----------------------
+
+def compact_vibes(batch_size=1000, pending_days=VIBE_PENDING_TTL_DAYS, dry_run=False, echo=click.echo):
+    """Move denied and expired pending vibes into vibe_history, one short transaction per batch.
+
+    Returns {status: vibes archived}. With `dry_run` nothing is written and
+    the counts are what would have been archived.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=pending_days)
+    stale = or_(
+        Vibe.status == 'denied',
+        (Vibe.status == 'pending') & (Vibe.created_at < cutoff)
+    )
+    
+    archived = {}
+    last_id = 0
+    while True:
+        # Rows locked by a concurrent accept/deny are left for the next run
+        rows = db.session.query(Vibe.id, Vibe.sender, Vibe.receiver, Vibe.status).filter(
+            Vibe.id > last_id,
+            stale
+        ).order_by(Vibe.id).limit(batch_size).with_for_update(skip_locked=True).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        
+        counts = {}
+        for row in rows:
+            counts[row.status] = counts.get(row.status, 0) + 1
+            archived[row.status] = archived.get(row.status, 0) + 1
+        if dry_run:
+            db.session.rollback()
+            continue
+        
+        now = datetime.utcnow()
+        upsert(VibeHistory, [
+            {'sender': row.sender, 'receiver': row.receiver,
+             'status': 'denied' if row.status == 'denied' else 'expired', 'archived_at': now}
+            for row in rows
+        ])
+        Vibe.query.filter(Vibe.id.in_([row.id for row in rows])).delete(synchronize_session=False)
+        deltas = {('vibes', ''): -len(rows), ('vibes_archived', ''): len(rows)}
+        for status, count in counts.items():
+            deltas[(f'vibes_{status}', '')] = -count
+        bump_stats(deltas)
+        db.session.commit()
+        echo(f"Archived {sum(archived.values())} vibes so far")
+    
+    return archived
+
+@app.cli.command('compact-vibes')
+@click.option('--batch-size', default=1000, help='Vibes archived per transaction.')
+@click.option('--pending-days', default=VIBE_PENDING_TTL_DAYS, help='Archive pending vibes older than this.')
+@click.option('--dry-run', is_flag=True, help='Only count what would be archived.')
+def compact_vibes_command(batch_size, pending_days, dry_run):
+    """Archive denied and expired pending vibes into vibe_history"""
+    archived = compact_vibes(batch_size, pending_days, dry_run)
+    verb = "Would archive" if dry_run else "Archived"
+    click.echo(
+        f"{verb} {sum(archived.values())} vibes "
+        f"({archived.get('denied', 0)} denied, {archived.get('pending', 0)} expired pending)"
+    )
+
 # ---------------------- Error Handlers ----------------------
 
 @app.errorhandler(404)
@@ -741,13 +2001,15 @@ def debug_route():
     """Detailed debug route using a separate HTML template"""
     try:
         # Collect debug data
-        user_count = User.query.count()
-        vibe_count = Vibe.query.count()
+        totals, _ = read_stats()
+        user_count = totals.get('users', 0)
+        vibe_count = totals.get('vibes', 0)
 
         debug_info = {
             "db_connected": True,
             "user_count": user_count,
             "vibe_count": vibe_count,
+            "profile": request_profiler.summary() if request_profiler else None,
             "session": dict(session),
             "env": {
                 "DATABASE_URL": bool(os.getenv("DATABASE_URL")),
@@ -777,15 +2039,20 @@ def debug_route():
 
 @app.route('/init-db')
 def init_db():
-    """Initialize database tables - use once then remove"""
-    try:
-        db.create_all()
-        return "Database tables created successfully!"
-    except Exception as e:
-        return f"Error creating tables: {e}"
+    """Report the schema version; changes are applied with `flask db upgrade`"""
+    user = g.user
+    if not user or user.reddit_username != ADMIN_USERNAME:
+        flash("Access denied.")
+        return redirect(url_for('landing'))
+    
+    applied = applied_migrations()
+    pending = [version for version, _, _ in SCHEMA_MIGRATIONS if version not in applied]
+    if pending:
+        return f"Schema has pending migrations {pending}. Run `flask --app app db upgrade`."
+    return f"Schema is up to date at version {max(applied)}."
 # ---------------------- Run Server ----------------------
 
 if __name__ == "__main__":
     with app.app_context():
-        db.create_all()
+        upgrade_schema()
     app.run(debug=False)
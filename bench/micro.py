@@ -0,0 +1,209 @@
+"""Time the hot routes through the Flask test client on synthetic data.
+
+    python -m bench.micro --users 1000 10000 100000 --output bench.json
+    python -m bench.micro --users 1000 --compare bench.json
+
+Each size runs in its own process against its own SQLite file, generated by
+bench.synth on first use and reused afterwards (see --data-dir). Startup is
+timed separately in fresh interpreters: importing the app, then serving its
+first request. Results are written as JSON; --compare prints the p50 change
+against an earlier run.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from loadtest.login_load import percentile
+
+ADMIN_USERNAME = 'bench_1'
+
+# (name, path, whether the page is viewed as the admin)
+ROUTES = (
+    ('/matches', '/matches', False),
+    ('/dashboard', '/dashboard', False),
+    ('/admin', '/admin', True),
+    ('/admin/reports', '/admin/reports', True),
+)
+
+def summarize(samples):
+    return {
+        'count': len(samples),
+        'mean_ms': round(sum(samples) / len(samples) * 1000, 3),
+        'p50_ms': round(percentile(samples, 50) * 1000, 3),
+        'p95_ms': round(percentile(samples, 95) * 1000, 3),
+        'p99_ms': round(percentile(samples, 99) * 1000, 3),
+        'max_ms': round(max(samples) * 1000, 3)
+    }
+
+def bench_score(users, calls, rng):
+    from app import calculate_match_score
+
+    pairs = [(rng.choice(users), rng.choice(users)) for _ in range(calls)]
+    samples = []
+    for a, b in pairs:
+        started = time.perf_counter()
+        calculate_match_score(a, b)
+        samples.append(time.perf_counter() - started)
+    return summarize(samples)
+
+def bench_route(client, path, viewers, requests, warmup):
+    samples = []
+    for i in range(warmup + requests):
+        user = viewers[i % len(viewers)]
+        with client.session_transaction() as s:
+            s['user_id'] = user.id
+            s['username'] = user.reddit_username
+        started = time.perf_counter()
+        response = client.get(path)
+        elapsed = time.perf_counter() - started
+        if response.status_code != 200:
+            raise RuntimeError(f"{path} returned {response.status_code} for {user.reddit_username}")
+        if i >= warmup:
+            samples.append(elapsed)
+    return summarize(samples)
+
+def run_size(users, requests, warmup, seed):
+    """Benchmark the database named by DATABASE_URL, generating it if needed"""
+    from app import app, db, User, Stat
+    from sqlalchemy import inspect
+    from bench.synth import generate
+
+    rng = random.Random(seed)
+    result = {'users': users}
+    with app.app_context():
+        # Stats are written last, so their absence means an interrupted run
+        if (not inspect(db.engine).has_table(Stat.__tablename__)
+                or User.query.count() != users or Stat.query.first() is None):
+            started = time.perf_counter()
+            result['rows'] = generate(users, seed=seed, echo=lambda message: print(message, file=sys.stderr))
+            result['generate_seconds'] = round(time.perf_counter() - started, 2)
+
+        active = User.query.filter_by(is_banned=False).all()
+        admin = User.query.filter_by(reddit_username=ADMIN_USERNAME).one()
+        # Distinct viewers per request so per-user caches mostly miss
+        viewers = rng.sample(active, min(len(active), warmup + requests))
+
+        result['calculate_match_score'] = bench_score(active, requests * 20, rng)
+
+        client = app.test_client()
+        for name, path, as_admin in ROUTES:
+            result[name] = bench_route(client, path, [admin] if as_admin else viewers, requests, warmup)
+    return result
+
+# Run in a fresh interpreter so nothing is imported or cached yet
+STARTUP_SCRIPT = '''
+import json, time
+started = time.perf_counter()
+from app import app
+imported = time.perf_counter()
+app.test_client().get('/')
+print(json.dumps({'import': imported - started, 'first_request': time.perf_counter() - imported}))
+'''
+
+def bench_startup(env, runs):
+    samples = {'import': [], 'first_request': []}
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, '-c', STARTUP_SCRIPT], env=env, check=True, capture_output=True, text=True
+        ).stdout
+        for name, seconds in json.loads(output.strip().splitlines()[-1]).items():
+            samples[name].append(seconds)
+    return {f'startup_{name}': summarize(values) for name, values in samples.items()}
+
+def _revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(previous, current):
+    for size, routes in current['results'].items():
+        before = previous.get('results', {}).get(size)
+        if not before:
+            continue
+        print(f"{size} users")
+        for name, stats in routes.items():
+            if not isinstance(stats, dict) or 'p50_ms' not in stats or name not in before:
+                continue
+            old, new = before[name]['p50_ms'], stats['p50_ms']
+            change = (new - old) / old * 100 if old else 0.0
+            print(f"  {name:<24} p50 {old:>9.3f} -> {new:>9.3f} ms ({change:+.1f}%)")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--requests', type=int, default=50, help='Timed requests per route.')
+    parser.add_argument('--warmup', type=int, default=5, help='Untimed requests per route.')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--startup-runs', type=int, default=5, help='Fresh interpreters timed per size.')
+    parser.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(), 'vibeapp-bench'),
+                        help='Where the generated SQLite files are kept between runs.')
+    parser.add_argument('--output', help='Write results to this JSON file.')
+    parser.add_argument('--compare', help='Earlier results file to compare against.')
+    parser.add_argument('--single', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        # Child process: one size, database already chosen through DATABASE_URL
+        result = run_size(args.users[0], args.requests, args.warmup, args.seed)
+        with open(args.output, 'w') as f:
+            json.dump(result, f)
+        return
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    report = {
+        'meta': {
+            'revision': _revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'started_at': datetime.utcnow().isoformat(timespec='seconds'),
+            'requests': args.requests,
+            'scoring_backend': os.environ.get('MATCH_SCORING_BACKEND', 'python')
+        },
+        'results': {}
+    }
+    for users in args.users:
+        database = os.path.join(args.data_dir, f'bench-{users}-{args.seed}.db')
+        env = dict(
+            os.environ,
+            DATABASE_URL=f'sqlite:///{database}',
+            ADMIN_USERNAME=ADMIN_USERNAME,
+            SECRET_KEY=os.environ.get('SECRET_KEY', 'bench')
+        )
+        with tempfile.NamedTemporaryFile(suffix='.json', delete=False) as f:
+            result_path = f.name
+        try:
+            subprocess.run([
+                sys.executable, '-m', 'bench.micro', '--single',
+                '--users', str(users), '--requests', str(args.requests),
+                '--warmup', str(args.warmup), '--seed', str(args.seed), '--output', result_path
+            ], env=env, check=True, stdout=subprocess.DEVNULL)
+            with open(result_path) as f:
+                report['results'][str(users)] = json.load(f)
+            report['results'][str(users)].update(bench_startup(env, args.startup_runs))
+        finally:
+            os.unlink(result_path)
+        print(f"Finished {users} users", file=sys.stderr)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+"""Fill a database with synthetic users, vibes and matches.
+
+    python -m bench.synth --database-url sqlite:///bench.db --users 10000
+
+Everything already in the database is dropped first, so anything but a
+SQLite file is refused unless --force is given.
+
+Interests are drawn from the real option lists with a popularity skew, and
+vibes follow a preferential-attachment graph so a few users receive many
+vibes while most receive a handful. The same --seed always produces the same
+data.
+"""
+import argparse
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+# Share of sent vibes in each status
+VIBE_STATUSES = (('pending', 0.5), ('accepted', 0.3), ('denied', 0.2))
+
+def _skewed_weights(options, rng):
+    # Zipf-like popularity over a shuffled copy of the option list
+    order = list(options)
+    rng.shuffle(order)
+    return order, [1.0 / (rank + 1) for rank in range(len(order))]
+
+def _pick_interests(options, weights, rng):
+    picked = set(rng.choices(options, weights=weights, k=rng.randint(1, 5)))
+    return ','.join(sorted(picked))
+
+def user_rows(count, rng, now):
+    from scoring import MUSIC_OPTIONS, MOVIE_OPTIONS, TOPIC_OPTIONS
+
+    music = _skewed_weights(MUSIC_OPTIONS, rng)
+    movies = _skewed_weights(MOVIE_OPTIONS, rng)
+    topics = _skewed_weights(TOPIC_OPTIONS, rng)
+    rows = []
+    for i in range(1, count + 1):
+        age = max(18, min(60, int(rng.gauss(26, 5))))
+        rows.append({
+            'id': i,
+            'reddit_username': f'bench_{i}',
+            'nickname': f'Bench {i}',
+            'age': age,
+            'bio': 'Synthetic benchmark user',
+            'preferred_age_min': max(18, age - rng.randint(2, 6)),
+            'preferred_age_max': age + rng.randint(2, 8),
+            'interests_music': _pick_interests(*music, rng),
+            'interests_movies': _pick_interests(*movies, rng),
+            'interests_topics': _pick_interests(*topics, rng),
+            'account_age': rng.randint(30, 4000),
+            'karma': int(rng.paretovariate(1.2) * 50),
+            'joined': now - timedelta(minutes=rng.randint(0, 60 * 24 * 90)),
+            # bench_1 stays unbanned so it can act as the admin
+            'is_banned': i > 1 and rng.random() < 0.01
+        })
+    return rows
+
+def vibe_rows(users, vibes_per_user, rng, now):
+    """Vibes sent by each user, biased towards already-popular receivers"""
+    statuses = [status for status, _ in VIBE_STATUSES]
+    status_weights = [weight for _, weight in VIBE_STATUSES]
+    names = {u['id']: u['reddit_username'] for u in users}
+    # Every received vibe adds another ticket for that user
+    tickets = list(names)
+    seen = set()
+    rows = []
+    for sender_id in names:
+        for _ in range(min(len(names) - 1, int(rng.expovariate(1.0 / vibes_per_user)))):
+            receiver_id = rng.choice(tickets)
+            if receiver_id == sender_id or (sender_id, receiver_id) in seen:
+                continue
+            seen.add((sender_id, receiver_id))
+            tickets.append(receiver_id)
+            rows.append({
+                'sender': names[sender_id],
+                'receiver': names[receiver_id],
+                'sender_id': sender_id,
+                'receiver_id': receiver_id,
+                'status': rng.choices(statuses, weights=status_weights)[0],
+                'created_at': now - timedelta(minutes=rng.randint(0, 60 * 24 * 14))
+            })
+    return rows
+
+def _insert(model, rows, batch_size):
+    from app import db
+
+    for start in range(0, len(rows), batch_size):
+        db.session.execute(model.__table__.insert(), rows[start:start + batch_size])
+
+def generate(users, vibes_per_user=5.0, seed=1, batch_size=5000, echo=print, force=False):
+    """Replace the app database's contents with a synthetic population.
+
+    Must run inside an app context. Refuses to drop anything but a SQLite
+    database unless `force` is set. Returns row counts per table.
+    """
+    from app import (
+        db, User, Vibe, Match, InterestMask, Stat, SchemaMigration, SCHEMA_MIGRATIONS, match_pair, recount_stats
+    )
+    from scoring import encode_profile
+    from interest_index import IndexedProfile
+
+    url = db.engine.url
+    if url.get_backend_name() != 'sqlite' and not force:
+        raise RuntimeError(f"Refusing to drop every table of {url!r}; pass force=True (--force) to do it anyway")
+
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    started = time.perf_counter()
+
+    db.drop_all()
+    db.create_all()
+    # Built from the current models, so already at the latest schema version
+    db.session.add_all(
+        SchemaMigration(version=version, description=description)
+        for version, description, _ in SCHEMA_MIGRATIONS
+    )
+
+    people = user_rows(users, rng, now)
+    _insert(User, people, batch_size)
+
+    masks = []
+    for row in people:
+        profile = IndexedProfile(
+            row['id'], row['reddit_username'], row['age'],
+            row['interests_music'], row['interests_movies'], row['interests_topics']
+        )
+        music, movies, topics, _ = encode_profile(profile)
+        masks.append({'user_id': row['id'], 'music': music, 'movies': movies, 'topics': topics})
+    _insert(InterestMask, masks, batch_size)
+
+    vibes = vibe_rows(people, vibes_per_user, rng, now)
+    _insert(Vibe, vibes, batch_size)
+
+    matches = {}
+    for v in vibes:
+        if v['status'] == 'accepted':
+            pair = match_pair(v['sender_id'], v['receiver_id'])
+            matches[pair] = {'user_a_id': pair[0], 'user_b_id': pair[1], 'created_at': v['created_at']}
+    _insert(Match, list(matches.values()), batch_size)
+    db.session.commit()
+
+    recount_stats(echo=echo)
+
+    counts = {
+        'users': len(people),
+        'vibes': len(vibes),
+        'matches': len(matches),
+        'stats': Stat.query.count()
+    }
+    echo(f"Generated {counts} in {time.perf_counter() - started:.1f}s")
+    return counts
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url', required=True, help='Database to overwrite, e.g. sqlite:///bench.db')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--vibes-per-user', type=float, default=5.0)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--force', action='store_true', help='Allow overwriting a database that is not SQLite')
+    args = parser.parse_args()
+
+    # The app reads DATABASE_URL at import, so never fall back to the shell's
+    os.environ['DATABASE_URL'] = args.database_url
+    from app import app
+    with app.app_context():
+        try:
+            generate(args.users, args.vibes_per_user, args.seed, force=args.force)
+        except RuntimeError as e:
+            parser.error(str(e))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+import logging
+import queue
+import threading
+import time
+from collections import namedtuple
+
+log = logging.getLogger('vibeapp.events')
+
+# One published event; `id` orders events and doubles as the SSE event id
+StreamEvent = namedtuple('StreamEvent', ['id', 'user_id', 'kind', 'data'])
+
+# Put on a subscription whose reader fell too far behind; the stream closes
+# and the browser reconnects with Last-Event-ID to replay what it missed
+OVERFLOW = object()
+
+class Subscription:
+    def __init__(self, user_id, maxsize):
+        self.user_id = user_id
+        self._queue = queue.Queue(maxsize=maxsize)
+
+    def get(self, timeout):
+        """Next event, OVERFLOW, or None if nothing arrived within `timeout`"""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def put(self, event):
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            # Make room for the marker so the reader learns it missed events
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                pass
+            self._queue.put_nowait(OVERFLOW)
+
+class EventBroker:
+    """Per-process fan-out of published events to open /events streams.
+
+    Events are shared between processes through a table (see publish_event
+    in app.py). One poller thread per process reads new rows every
+    `poll_interval` seconds and hands them to local subscribers, so idle
+    streams cost a queue each and no database work. The poller only runs
+    while someone is subscribed.
+
+    Subscribers block on a queue.Queue, which gunicorn's gevent worker
+    turns into a cheap green-thread wait.
+    """
+
+    def __init__(self, poll_interval=1.0, queue_size=100):
+        self.poll_interval = poll_interval
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._subscribers = {}  # user_id -> set(Subscription)
+        self._poller = None
+
+    @property
+    def streams(self):
+        with self._lock:
+            return sum(len(subs) for subs in self._subscribers.values())
+
+    def subscribe(self, user_id, fetch, latest_id):
+        """Register a stream; `fetch(after_id)` and `latest_id()` feed the poller"""
+        subscription = Subscription(user_id, self.queue_size)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(subscription)
+            if self._poller is None or not self._poller.is_alive():
+                self._poller = threading.Thread(
+                    target=self._poll, args=(fetch, latest_id()), name='event-poller', daemon=True
+                )
+                self._poller.start()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subs = self._subscribers.get(subscription.user_id)
+            if subs is not None:
+                subs.discard(subscription)
+                if not subs:
+                    del self._subscribers[subscription.user_id]
+
+    def dispatch(self, events):
+        with self._lock:
+            for event in events:
+                for subscription in self._subscribers.get(event.user_id, ()):
+                    subscription.put(event)
+
+    def _poll(self, fetch, last_id):
+        while True:
+            with self._lock:
+                if not self._subscribers:
+                    self._poller = None
+                    return
+            try:
+                events = fetch(last_id)
+            except Exception:
+                # A failed poll is retried on the next tick
+                log.exception("Polling for events failed")
+                events = []
+            if events:
+                last_id = events[-1].id
+                self.dispatch(events)
+            else:
+                time.sleep(self.poll_interval)
@@ -0,0 +1,50 @@
+import os
+import shutil
+import sys
+import tempfile
+
+# Picked up automatically by `gunicorn app:app` from the project root.
+#
+# Threaded workers keep serving other requests while a login waits on
+# Reddit, so login concurrency is workers * threads rather than workers.
+# GUNICORN_WORKER_CLASS=gevent (what render.yaml deploys) runs requests on
+# green threads instead, which also makes long-lived /events streams cheap.
+# The worker count comes from WEB_CONCURRENCY as usual.
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+# gunicorn silently turns `sync` into `gthread` when threads > 1
+threads = int(os.environ.get('GUNICORN_THREADS', 8 if worker_class == 'gthread' else 1))
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 1000))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+keepalive = 5
+
+# GUNICORN_PRELOAD=1 imports the app once in the master and forks workers
+# from it. Importing the app opens no connections, so this is safe.
+# Not with gevent: the app must be imported after the worker monkey-patches.
+preload_app = (
+    worker_class != 'gevent' and os.environ.get('GUNICORN_PRELOAD', '').lower() in ('1', 'true', 'yes')
+)
+
+# Workers write their metrics to files here so /metrics can add up every
+# process. It has to exist before the app is imported, which a preloading
+# master does before any server hook runs, so it is set up here: gunicorn
+# reads this file first. Counters from a previous run are cleared.
+prometheus_dir = os.environ.setdefault(
+    'PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'vibeapp-metrics')
+)
+shutil.rmtree(prometheus_dir, ignore_errors=True)
+os.makedirs(prometheus_dir)
+
+def post_fork(server, worker):
+    if worker_class == 'gevent':
+        # Make psycopg2 wait on the gevent hub instead of blocking the worker
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
+    # Never share pooled connections inherited from a preloading master
+    app_module = sys.modules.get('app')
+    if app_module is not None:
+        with app_module.app.app_context():
+            app_module.db.engine.dispose(close=False)
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
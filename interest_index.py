@@ -0,0 +1,108 @@
+import threading
+import time
+from collections import namedtuple
+
+from scoring import encode_profile, MUSIC, MOVIES, TOPICS, AGE, NO_AGE
+
+# Snapshot of the columns needed to score a candidate. The field names
+# match User so the scoring helpers accept either.
+IndexedProfile = namedtuple('IndexedProfile', [
+    'id', 'reddit_username', 'age', 'interests_music', 'interests_movies', 'interests_topics'
+])
+
+def _bits(mask):
+    bit = 0
+    while mask:
+        if mask & 1:
+            yield bit
+        mask >>= 1
+        bit += 1
+
+class InterestIndex:
+    """Process-local inverted index from interest option to user ids, bucketed by age.
+
+    Each gunicorn worker keeps its own copy, so writes handled by another
+    worker only show up after the next rebuild (every `rebuild_after`
+    seconds). Callers must re-check eligibility against the database for
+    anything they display.
+    """
+
+    def __init__(self, rebuild_after=300):
+        self.rebuild_after = rebuild_after
+        self._lock = threading.RLock()
+        self._postings = {}  # (column, bit) -> {age: set(user_id)}
+        self._profiles = {}  # user_id -> (IndexedProfile, encoded profile)
+        self._built_at = None
+
+    def __len__(self):
+        return len(self._profiles)
+
+    def ensure_loaded(self, loader):
+        """Build the index from `loader()` rows if it is missing or too old"""
+        with self._lock:
+            if self._built_at is not None and time.monotonic() - self._built_at < self.rebuild_after:
+                return
+            self._postings = {}
+            self._profiles = {}
+            for row in loader():
+                self._add(row)
+            self._built_at = time.monotonic()
+
+    def update(self, user):
+        """Re-index one user after a profile change, ban or unban"""
+        with self._lock:
+            if self._built_at is None:
+                return  # Nothing built yet, the first load will pick it up
+            self._remove(user.id)
+            if not user.is_banned and user.nickname and user.bio and user.age is not None:
+                self._add(user)
+
+    def remove(self, user_id):
+        with self._lock:
+            self._remove(user_id)
+
+    def candidates(self, viewer, age_min, age_max):
+        """Profiles in [age_min, age_max] sharing at least one interest with `viewer`"""
+        if age_min is None or age_max is None:
+            return []
+        encoded = encode_profile(viewer)
+        found = set()
+        with self._lock:
+            for column in (MUSIC, MOVIES, TOPICS):
+                for bit in _bits(encoded[column]):
+                    by_age = self._postings.get((column, bit))
+                    if not by_age:
+                        continue
+                    for age, user_ids in by_age.items():
+                        if age_min <= age <= age_max:
+                            found |= user_ids
+            found.discard(viewer.id)
+            return [self._profiles[user_id][0] for user_id in found]
+
+    def _add(self, row):
+        profile = IndexedProfile(
+            row.id, row.reddit_username, row.age,
+            row.interests_music, row.interests_movies, row.interests_topics
+        )
+        encoded = encode_profile(profile)
+        if encoded[AGE] == NO_AGE:
+            return
+        self._profiles[row.id] = (profile, encoded)
+        for column in (MUSIC, MOVIES, TOPICS):
+            for bit in _bits(encoded[column]):
+                by_age = self._postings.setdefault((column, bit), {})
+                by_age.setdefault(encoded[AGE], set()).add(row.id)
+
+    def _remove(self, user_id):
+        entry = self._profiles.pop(user_id, None)
+        if entry is None:
+            return
+        encoded = entry[1]
+        for column in (MUSIC, MOVIES, TOPICS):
+            for bit in _bits(encoded[column]):
+                by_age = self._postings.get((column, bit), {})
+                user_ids = by_age.get(encoded[AGE])
+                if user_ids is not None:
+                    user_ids.discard(user_id)
+                    if not user_ids:
+                        del by_age[encoded[AGE]]
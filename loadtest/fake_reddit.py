@@ -0,0 +1,109 @@
+"""Local stand-in for Reddit's OAuth endpoints.
+
+Serves /api/v1/authorize, /api/v1/access_token, /api/v1/me and
+/user/<name>/about.json with an optional artificial delay. Point the app at
+it with
+
+    REDDIT_AUTH_BASE=http://127.0.0.1:9100 REDDIT_API_BASE=http://127.0.0.1:9100
+
+Every authorization code maps to its own account, so `code=alice` logs in
+as `fake_alice`.
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+
+class FakeRedditHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    latency = 0.0
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == '/api/v1/authorize':
+            # Approve immediately and bounce back to the app with the state as code
+            query = parse_qs(url.query)
+            redirect_uri = query.get('redirect_uri', [''])[0]
+            code = query.get('state', ['user'])[0]
+            self.send_response(302)
+            self.send_header('Location', f"{redirect_uri}?{urlencode({'code': code, 'state': code})}")
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        if url.path == '/api/v1/me':
+            time.sleep(self.latency)
+            token = self.headers.get('Authorization', '').split(' ')[-1]
+            if not token.startswith('fake-token-'):
+                self._send_json({'error': 401}, status=401)
+                return
+            name = token[len('fake-token-'):]
+            self._send_json({
+                'name': f'fake_{name}',
+                'created_utc': time.time() - 400 * 86400,
+                'link_karma': 100,
+                'comment_karma': 250
+            })
+            return
+
+        if url.path.startswith('/user/') and url.path.endswith('/about.json'):
+            time.sleep(self.latency)
+            name = url.path[len('/user/'):-len('/about.json')]
+            self._send_json({'kind': 't2', 'data': {
+                'name': name,
+                'created_utc': time.time() - 400 * 86400,
+                'link_karma': 100,
+                'comment_karma': 250
+            }})
+            return
+
+        self._send_json({'error': 404}, status=404)
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        length = int(self.headers.get('Content-Length', 0))
+        form = parse_qs(self.rfile.read(length).decode())
+        if url.path != '/api/v1/access_token':
+            self._send_json({'error': 404}, status=404)
+            return
+        time.sleep(self.latency)
+        code = form.get('code', [''])[0]
+        if not code:
+            self._send_json({'error': 'invalid_grant'}, status=400)
+            return
+        self._send_json({'access_token': f'fake-token-{code}', 'token_type': 'bearer', 'expires_in': 3600})
+
+def serve(host='127.0.0.1', port=9100, latency=0.0, background=False):
+    """Start the fake server; with background=True return it running in a thread"""
+    handler = type('Handler', (FakeRedditHandler,), {'latency': latency})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    if background:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+    print(f"Fake Reddit listening on http://{host}:{port} (latency {latency:.3f}s)")
+    server.serve_forever()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9100)
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds to delay each token and /me call.')
+    args = parser.parse_args()
+    serve(args.host, args.port, args.latency)
+
+if __name__ == '__main__':
+    main()
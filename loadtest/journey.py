@@ -0,0 +1,202 @@
+"""Drive the whole user journey against gunicorn and report per-route latency.
+
+Each virtual pair of users logs in, completes the six onboarding steps,
+confirms the review page and opens /matches; then the first sends a vibe
+to the second, the second accepts and the first unmatches. With --spawn
+the script starts the fake Reddit server and `gunicorn app:app` itself:
+
+    python -m loadtest.journey --spawn --pairs 200 --concurrency 20
+    WEB_CONCURRENCY=4 GUNICORN_THREADS=8 python -m loadtest.journey --spawn --latency 0.3
+
+Spawned runs use a fresh SQLite file unless --database-url is given; SQLite
+serializes writes, so size workers against a Postgres database. Without
+--spawn, point --app at an app that already talks to the fake server.
+"""
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import requests
+
+from loadtest import fake_reddit
+from loadtest.login_load import percentile
+from scoring import MUSIC_OPTIONS, MOVIE_OPTIONS, TOPIC_OPTIONS
+
+class Client:
+    """One virtual user: a cookie session plus the timings it collected"""
+
+    def __init__(self, app_url, code):
+        self.app_url = app_url
+        self.code = code
+        self.username = f'fake_{code}'
+        self.http = requests.Session()
+        self.samples = []
+
+    def call(self, route, method, path, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = self.http.request(method, self.app_url + path, allow_redirects=False, timeout=60, **kwargs)
+        except requests.exceptions.RequestException:
+            self.samples.append((route, time.perf_counter() - started, False))
+            return None
+        elapsed = time.perf_counter() - started
+        # Anything that bounces back to the landing page means the step failed
+        landed = response.status_code in (301, 302, 303) and urlparse(response.headers.get('Location', '')).path == '/'
+        self.samples.append((route, elapsed, response.status_code < 400 and not landed))
+        return response
+
+def onboard(client, rng):
+    client.call('GET /login', 'GET', '/login')
+    client.call('GET /callback', 'GET', '/callback', params={'code': client.code})
+    age = rng.randint(20, 35)
+    steps = (
+        ('/onboarding/nickname', {'nickname': client.username}),
+        ('/onboarding/age', {'age': age, 'preferred_age_min': age - 5, 'preferred_age_max': age + 5}),
+        ('/onboarding/bio', {'bio': 'Load test user'}),
+        ('/onboarding/interests/music', {'music_interests': rng.sample(MUSIC_OPTIONS, 3)}),
+        ('/onboarding/interests/movies', {'movie_interests': rng.sample(MOVIE_OPTIONS, 3)}),
+        ('/onboarding/interests/topics', {'topic_interests': rng.sample(TOPIC_OPTIONS, 3)}),
+    )
+    for path, form in steps:
+        client.call(f'POST {path}', 'POST', path, data=form)
+    client.call('GET /onboarding/review', 'GET', '/onboarding/review')
+    client.call('POST /onboarding/review', 'POST', '/onboarding/review')
+    client.call('GET /matches', 'GET', '/matches')
+
+def one_pair(app_url, prefix, i):
+    rng = random.Random(i)
+    sender = Client(app_url, f'{prefix}a{i}')
+    receiver = Client(app_url, f'{prefix}b{i}')
+    onboard(sender, rng)
+    onboard(receiver, rng)
+    sender.call('POST /send-vibe/<user>', 'POST', f'/send-vibe/{receiver.username}')
+    receiver.call('POST /accept-vibe/<user>', 'POST', f'/accept-vibe/{sender.username}')
+    sender.call('POST /unmatch/<user>', 'POST', f'/unmatch/{receiver.username}')
+    return sender.samples + receiver.samples
+
+def run(app_url, pairs, concurrency):
+    prefix = uuid.uuid4().hex[:8]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda i: one_pair(app_url, prefix, i), range(pairs)))
+    wall = time.perf_counter() - started
+
+    by_route = defaultdict(list)
+    for samples in results:
+        for route, elapsed, ok in samples:
+            by_route[route].append((elapsed, ok))
+
+    routes = {}
+    for route, samples in by_route.items():
+        latencies = [elapsed for elapsed, ok in samples if ok]
+        routes[route] = {
+            'requests': len(samples),
+            'failed': len(samples) - len(latencies),
+            'per_second': round(len(latencies) / wall, 2) if wall else None,
+            'p50_ms': round(percentile(latencies, 50) * 1000, 1) if latencies else None,
+            'p95_ms': round(percentile(latencies, 95) * 1000, 1) if latencies else None,
+            'p99_ms': round(percentile(latencies, 99) * 1000, 1) if latencies else None
+        }
+    return {
+        'pairs': pairs,
+        'concurrency': concurrency,
+        'wall_seconds': round(wall, 3),
+        'journeys_per_second': round(2 * pairs / wall, 2) if wall else None,
+        'requests_per_second': round(sum(r['requests'] for r in routes.values()) / wall, 2) if wall else None,
+        'routes': routes
+    }
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def _wait_for(url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            requests.get(url, timeout=1)
+            return
+        except requests.exceptions.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+def spawn(latency, database_url):
+    """Start the fake Reddit server and gunicorn; returns (app url, gunicorn process, cleanup paths)"""
+    reddit_port = _free_port()
+    fake_reddit.serve(port=reddit_port, latency=latency, background=True)
+    reddit_url = f'http://127.0.0.1:{reddit_port}'
+
+    cleanup = []
+    if not database_url:
+        fd, path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        cleanup.append(path)
+        database_url = f'sqlite:///{path}'
+
+    app_port = _free_port()
+    env = dict(
+        os.environ,
+        DATABASE_URL=database_url,
+        SECRET_KEY=os.environ.get('SECRET_KEY', 'loadtest'),
+        REDDIT_AUTH_BASE=reddit_url,
+        REDDIT_API_BASE=reddit_url,
+        REDDIT_CLIENT_ID='loadtest',
+        REDDIT_CLIENT_SECRET='loadtest',
+        REDIRECT_URI=f'http://127.0.0.1:{app_port}/callback'
+    )
+    # The app does not create tables on import
+    subprocess.run([sys.executable, '-m', 'flask', '--app', 'app', 'db', 'upgrade'],
+                   env=env, check=True, stdout=subprocess.DEVNULL)
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', 'app:app', '-b', f'127.0.0.1:{app_port}'],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    app_url = f'http://127.0.0.1:{app_port}'
+    try:
+        _wait_for(app_url + '/')
+    except RuntimeError:
+        process.terminate()
+        raise
+    return app_url, process, cleanup
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--app', default='http://127.0.0.1:8000', help='Base URL of a running app.')
+    parser.add_argument('--spawn', action='store_true', help='Start fake Reddit and gunicorn for this run.')
+    parser.add_argument('--latency', type=float, default=0.0, help='Fake Reddit delay per call when spawning.')
+    parser.add_argument('--database-url', help='Database for the spawned app (default: a new SQLite file).')
+    parser.add_argument('--pairs', type=int, default=50)
+    parser.add_argument('--concurrency', type=int, default=10)
+    args = parser.parse_args()
+
+    if not args.spawn:
+        print(json.dumps(run(args.app.rstrip('/'), args.pairs, args.concurrency), indent=2))
+        return
+
+    app_url, process, cleanup = spawn(args.latency, args.database_url)
+    try:
+        report = run(app_url, args.pairs, args.concurrency)
+        report['gunicorn'] = {
+            name: os.environ.get(name)
+            for name in ('WEB_CONCURRENCY', 'GUNICORN_WORKER_CLASS', 'GUNICORN_THREADS')
+        }
+        print(json.dumps(report, indent=2))
+    finally:
+        process.terminate()
+        process.wait()
+        for path in cleanup:
+            os.unlink(path)
+
+if __name__ == '__main__':
+    main()
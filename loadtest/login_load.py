@@ -0,0 +1,69 @@
+"""Measure login throughput through /callback against the fake Reddit server.
+
+Start the app pointed at the fake server, for example
+
+    python -m loadtest.fake_reddit --latency 0.5 &
+    REDDIT_AUTH_BASE=http://127.0.0.1:9100 REDDIT_API_BASE=http://127.0.0.1:9100 \\
+        gunicorn app:app -b 127.0.0.1:8000
+
+then run
+
+    python -m loadtest.login_load --app http://127.0.0.1:8000 --logins 200 --concurrency 50
+
+Compare `GUNICORN_WORKER_CLASS=sync` with the default threaded workers to
+see how many logins a worker can hold while Reddit is slow.
+"""
+import argparse
+import json
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import requests
+
+def percentile(samples, pct):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def one_login(app_url, prefix, i):
+    code = f'{prefix}{i}'
+    started = time.perf_counter()
+    response = requests.get(f'{app_url}/callback', params={'code': code}, allow_redirects=False, timeout=60)
+    elapsed = time.perf_counter() - started
+    # Failed logins are sent back to the landing page
+    ok = response.status_code == 302 and urlparse(response.headers.get('Location', '/')).path != '/'
+    return ok, elapsed
+
+def run(app_url, logins, concurrency):
+    prefix = uuid.uuid4().hex[:8]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda i: one_login(app_url, prefix, i), range(logins)))
+    wall = time.perf_counter() - started
+    latencies = [elapsed for ok, elapsed in results if ok]
+    return {
+        'logins': logins,
+        'concurrency': concurrency,
+        'succeeded': len(latencies),
+        'failed': logins - len(latencies),
+        'wall_seconds': round(wall, 3),
+        'logins_per_second': round(len(latencies) / wall, 2) if wall else None,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 1) if latencies else None,
+        'p95_ms': round(percentile(latencies, 95) * 1000, 1) if latencies else None,
+        'p99_ms': round(percentile(latencies, 99) * 1000, 1) if latencies else None
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--app', default='http://127.0.0.1:8000', help='Base URL of the running app.')
+    parser.add_argument('--logins', type=int, default=100)
+    parser.add_argument('--concurrency', type=int, default=20)
+    args = parser.parse_args()
+    print(json.dumps(run(args.app.rstrip('/'), args.logins, args.concurrency), indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+"""Structured JSON logging that stays off the request path.
+
+Records are filtered and queued by the calling thread and formatted and
+written by a background thread, so a slow stdout never slows a login. A
+full queue drops records instead of blocking.
+
+    LOG_LEVEL=INFO           minimum level for the vibeapp logger
+    LOG_SAMPLE_DEBUG=0.01    share of requests whose DEBUG records are kept
+    LOG_SAMPLE_INFO=1        share of requests whose INFO records are kept
+    LOG_QUEUE_SIZE=10000     records buffered before dropping
+
+WARNING and above are never sampled away.
+"""
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import uuid
+from datetime import datetime, timezone
+
+from flask import g, has_request_context, request
+
+# Field names whose values never reach the log, wherever they are nested
+REDACTED_KEYS = frozenset([
+    'access_token', 'refresh_token', 'id_token', 'token', 'code', 'client_secret',
+    'secret', 'password', 'authorization', 'cookie', 'session'
+])
+REDACTED = '[redacted]'
+
+# Attributes every LogRecord has; anything else was passed through `extra`
+_RECORD_FIELDS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+logger = logging.getLogger('vibeapp')
+
+_traceback_formatter = logging.Formatter()
+
+def redact(value):
+    if isinstance(value, dict):
+        return {
+            k: REDACTED if str(k).lower() in REDACTED_KEYS else redact(v)
+            for k, v in value.items()
+        }
+    if isinstance(value, (list, tuple)):
+        return [redact(v) for v in value]
+    return value
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage()
+        }
+        fields = {k: v for k, v in vars(record).items() if k not in _RECORD_FIELDS}
+        entry.update(redact(fields))
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+class RequestContextFilter(logging.Filter):
+    """Tag records with the request's correlation id and apply level sampling"""
+
+    def __init__(self, sample_rates):
+        super().__init__()
+        self.sample_rates = sample_rates
+
+    def filter(self, record):
+        rate = self.sample_rates.get(record.levelno, 1.0)
+        if has_request_context():
+            record.request_id = g.get('request_id')
+            # One draw per request keeps a sampled request's records together
+            draw = g.setdefault('log_sample', random.random())
+        else:
+            draw = random.random()
+        return draw < rate
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that counts and drops records when the writer falls behind"""
+
+    dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def prepare(self, record):
+        # Merge args and render the traceback now, while they are still valid;
+        # the JSON formatting itself happens on the writer thread
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _traceback_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+_listener = None
+_handler = None
+
+def _start_writer():
+    global _listener
+    _handler.queue = queue.Queue(maxsize=int(os.environ.get('LOG_QUEUE_SIZE', 10000)))
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(JsonFormatter())
+    _listener = logging.handlers.QueueListener(_handler.queue, stream, respect_handler_level=False)
+    _listener.start()
+
+def _stop_writer():
+    if _listener is not None and _listener._thread is not None:
+        _listener.stop()
+
+def _assign_request_id():
+    g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex
+
+def _echo_request_id(response):
+    if 'request_id' in g:
+        response.headers['X-Request-ID'] = g.request_id
+    return response
+
+def init_app(app):
+    """Route the vibeapp logger through the background writer and tag requests"""
+    global _handler
+    if _handler is None:
+        sample_rates = {
+            logging.DEBUG: float(os.environ.get('LOG_SAMPLE_DEBUG', 0.01)),
+            logging.INFO: float(os.environ.get('LOG_SAMPLE_INFO', 1.0))
+        }
+        _handler = DroppingQueueHandler(queue.Queue())
+        _handler.addFilter(RequestContextFilter(sample_rates))
+        _start_writer()
+        atexit.register(_stop_writer)
+        # Forked gunicorn workers do not inherit the writer thread
+        os.register_at_fork(after_in_child=_start_writer)
+        logger.addHandler(_handler)
+        logger.setLevel(os.environ.get('LOG_LEVEL', 'INFO').upper())
+        logger.propagate = False
+
+    app.before_request(_assign_request_id)
+    app.after_request(_echo_request_id)
+    return logger
@@ -0,0 +1,115 @@
+"""Prometheus metrics for the app, scraped from /metrics.
+
+Under gunicorn every worker writes its samples to files in
+PROMETHEUS_MULTIPROC_DIR (set up by gunicorn.conf.py) and /metrics adds
+up all of them, so it does not matter which worker answers the scrape.
+Without that variable the metrics are simply per process.
+"""
+import os
+import time
+
+import requests
+from flask import Response, g, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+)
+from sqlalchemy import event
+
+MULTIPROCESS = bool(os.environ.get('PROMETHEUS_MULTIPROC_DIR'))
+
+# Buckets in seconds, dense around the page latencies we alert on
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+REQUESTS = Counter(
+    'vibeapp_http_requests_total', 'HTTP requests handled', ['endpoint', 'method', 'status']
+)
+REQUEST_LATENCY = Histogram(
+    'vibeapp_http_request_duration_seconds', 'Time spent handling a request', ['endpoint'],
+    buckets=LATENCY_BUCKETS
+)
+POOL_CHECKED_OUT = Gauge(
+    'vibeapp_db_pool_checked_out', 'Database connections currently checked out', multiprocess_mode='livesum'
+)
+POOL_OVERFLOW = Gauge(
+    'vibeapp_db_pool_overflow', 'Connections open beyond the pool size', multiprocess_mode='livesum'
+)
+POOL_CHECKOUTS = Counter(
+    'vibeapp_db_pool_checkouts_total', 'Connections handed out by the pool'
+)
+REDDIT_LATENCY = Histogram(
+    'vibeapp_reddit_request_duration_seconds', 'Time spent waiting on Reddit', ['call'],
+    buckets=LATENCY_BUCKETS
+)
+REDDIT_ERRORS = Counter(
+    'vibeapp_reddit_errors_total', 'Reddit calls that failed or returned an error status', ['call', 'reason']
+)
+EVENTS = Counter(
+    'vibeapp_events_total', 'Business events: signups and vibes sent, accepted and denied', ['event']
+)
+
+def record_event(name, count=1):
+    EVENTS.labels(name).inc(count)
+
+def reddit_call(call, func, *args, **kwargs):
+    """Run one Reddit API call, recording its latency and any failure"""
+    started = time.perf_counter()
+    try:
+        response = func(*args, **kwargs)
+    except requests.exceptions.RequestException as e:
+        REDDIT_ERRORS.labels(call, type(e).__name__).inc()
+        raise
+    finally:
+        REDDIT_LATENCY.labels(call).observe(time.perf_counter() - started)
+    if response.status_code >= 400:
+        REDDIT_ERRORS.labels(call, str(response.status_code)).inc()
+    return response
+
+def _start_timer():
+    g.metrics_started = time.perf_counter()
+
+def _observe_request(response):
+    started = g.pop('metrics_started', None)
+    if started is not None:
+        # Endpoint names keep label cardinality bounded, unlike raw paths
+        endpoint = request.endpoint or 'unmatched'
+        REQUEST_LATENCY.labels(endpoint).observe(time.perf_counter() - started)
+        REQUESTS.labels(endpoint, request.method, str(response.status_code)).inc()
+    return response
+
+def watch_pool(engine):
+    pool = engine.pool
+
+    def update(returning):
+        # Only QueuePool tracks these; other pools just count checkouts
+        if hasattr(pool, 'checkedout'):
+            # The checkin event fires before the connection is back in the queue
+            POOL_CHECKED_OUT.set(pool.checkedout() - returning)
+            POOL_OVERFLOW.set(max(0, pool.overflow()))
+
+    def checked_out(*args):
+        POOL_CHECKOUTS.inc()
+        update(0)
+
+    def checked_in(*args):
+        update(1)
+
+    event.listen(pool, 'checkout', checked_out)
+    event.listen(pool, 'checkin', checked_in)
+
+def metrics_view():
+    token = os.environ.get('METRICS_TOKEN')
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return Response('Unauthorized\n', status=401)
+    registry = REGISTRY
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
+
+def init_app(app, db):
+    """Time every request, watch the connection pool and serve /metrics"""
+    app.before_request(_start_timer)
+    app.after_request(_observe_request)
+    with app.app_context():
+        watch_pool(db.engine)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
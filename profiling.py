@@ -0,0 +1,121 @@
+import bisect
+import threading
+import time
+
+from flask import g, has_request_context, request, before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Upper bounds of the histogram buckets; the last bucket catches everything else
+TIME_BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+QUERY_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 200)
+
+class Histogram:
+    """Fixed-bucket histogram, cheap enough to update on every request"""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th quantile"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return self.max
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'mean': round(self.total / self.count, 2) if self.count else None,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'max': round(self.max, 2)
+        }
+
+class RequestProfiler:
+    """Per-route wall, SQL and template timings, reported in Server-Timing.
+
+    Installed by `init_app` only when profiling is switched on, so the
+    engine and signal hooks cost nothing otherwise.
+    """
+
+    METRICS = (('wall_ms', TIME_BUCKETS_MS), ('sql_ms', TIME_BUCKETS_MS),
+               ('template_ms', TIME_BUCKETS_MS), ('queries', QUERY_BUCKETS))
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = {}  # endpoint -> {metric: Histogram}
+
+    def init_app(self, app):
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        before_render_template.connect(self._template_started, app)
+        template_rendered.connect(self._template_finished, app)
+        event.listen(Engine, 'before_cursor_execute', self._query_started)
+        event.listen(Engine, 'after_cursor_execute', self._query_finished)
+
+    def _start(self):
+        g.profile = {'started': time.perf_counter(), 'sql': 0.0, 'queries': 0, 'template': 0.0}
+
+    def _template_started(self, sender, template, context, **extra):
+        if 'profile' in g:
+            g.profile['template_started'] = time.perf_counter()
+
+    def _template_finished(self, sender, template, context, **extra):
+        if 'profile' in g and 'template_started' in g.profile:
+            g.profile['template'] += time.perf_counter() - g.profile.pop('template_started')
+
+    def _query_started(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('profile_query_started', []).append(time.perf_counter())
+
+    def _query_finished(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info['profile_query_started'].pop()
+        # CLI commands and the suggestions worker also run queries
+        if has_request_context() and 'profile' in g:
+            g.profile['sql'] += time.perf_counter() - started
+            g.profile['queries'] += 1
+
+    def _finish(self, response):
+        profile = g.pop('profile', None)
+        if profile is None:
+            return response
+        wall = (time.perf_counter() - profile['started']) * 1000
+        sql = profile['sql'] * 1000
+        template = profile['template'] * 1000
+        response.headers.add('Server-Timing', f'app;dur={wall:.1f}')
+        response.headers.add('Server-Timing', f'db;desc="{profile["queries"]} queries";dur={sql:.1f}')
+        response.headers.add('Server-Timing', f'tpl;dur={template:.1f}')
+
+        endpoint = request.endpoint or 'unmatched'
+        with self._lock:
+            histograms = self._routes.get(endpoint)
+            if histograms is None:
+                histograms = self._routes[endpoint] = {name: Histogram(buckets) for name, buckets in self.METRICS}
+            histograms['wall_ms'].observe(wall)
+            histograms['sql_ms'].observe(sql)
+            histograms['template_ms'].observe(template)
+            histograms['queries'].observe(profile['queries'])
+        return response
+
+    def summary(self):
+        """{endpoint: {metric: summary}} for every route seen by this process"""
+        with self._lock:
+            return {
+                endpoint: {name: histogram.summary() for name, histogram in histograms.items()}
+                for endpoint, histograms in sorted(self._routes.items())
+            }
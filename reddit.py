@@ -0,0 +1,97 @@
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Base URLs are configurable so a local stub server can stand in for Reddit
+REDDIT_AUTH_BASE = os.environ.get('REDDIT_AUTH_BASE', 'https://www.reddit.com').rstrip('/')
+REDDIT_API_BASE = os.environ.get('REDDIT_API_BASE', 'https://oauth.reddit.com').rstrip('/')
+
+CONNECT_TIMEOUT = float(os.environ.get('REDDIT_CONNECT_TIMEOUT', 3.05))
+READ_TIMEOUT = float(os.environ.get('REDDIT_READ_TIMEOUT', 10))
+RETRIES = int(os.environ.get('REDDIT_RETRIES', 2))
+POOL_SIZE = int(os.environ.get('REDDIT_POOL_SIZE', 10))
+
+USER_AGENT = 'VibeMatchApp/0.1'
+
+_local = threading.local()
+_pid = None
+
+def _build_session():
+    # Connect errors are retried for every method. Read errors and 429/5xx
+    # responses are only retried for GET, because an authorization code is
+    # single use and re-posting it could fail a login that actually worked.
+    retry = Retry(
+        total=RETRIES,
+        connect=RETRIES,
+        read=RETRIES,
+        status=RETRIES,
+        backoff_factor=0.3,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset(['GET']),
+        raise_on_status=False,
+        respect_retry_after_header=True
+    )
+    adapter = HTTPAdapter(pool_connections=2, pool_maxsize=POOL_SIZE, max_retries=retry)
+    http = requests.Session()
+    http.mount('https://', adapter)
+    http.mount('http://', adapter)
+    http.headers['User-Agent'] = USER_AGENT
+    return http
+
+def get_session():
+    """Keep-alive session for Reddit calls, one per thread and per process"""
+    global _pid
+    if _pid != os.getpid():
+        # Forked worker: never reuse sockets inherited from the parent
+        _pid = os.getpid()
+        _local.__dict__.clear()
+    http = getattr(_local, 'session', None)
+    if http is None:
+        http = _local.session = _build_session()
+    return http
+
+def authorize_url(client_id, redirect_uri, state):
+    return (
+        f"{REDDIT_AUTH_BASE}/api/v1/authorize?"
+        f"client_id={client_id}&response_type=code&state={state}&"
+        f"redirect_uri={redirect_uri}&duration=temporary&scope=identity"
+    )
+
+def exchange_code(code, client_id, client_secret, redirect_uri):
+    """POST the authorization code for an access token"""
+    return get_session().post(
+        f"{REDDIT_AUTH_BASE}/api/v1/access_token",
+        auth=requests.auth.HTTPBasicAuth(client_id, client_secret),
+        data={
+            'grant_type': 'authorization_code',
+            'code': code,
+            'redirect_uri': redirect_uri
+        },
+        timeout=(CONNECT_TIMEOUT, READ_TIMEOUT)
+    )
+
+def fetch_me(access_token):
+    """GET /api/v1/me for the token's account"""
+    return get_session().get(
+        f"{REDDIT_API_BASE}/api/v1/me",
+        headers={'Authorization': f'bearer {access_token}'},
+        timeout=(CONNECT_TIMEOUT, READ_TIMEOUT)
+    )
+
+def about_user(username):
+    """GET the public profile of any account, used by the karma refresher"""
+    return get_session().get(
+        f"{REDDIT_AUTH_BASE}/user/{username}/about.json",
+        timeout=(CONNECT_TIMEOUT, READ_TIMEOUT)
+    )
+
+def account_stats(user_data, now=None):
+    """(account age in days, total karma) from a /me or about.json payload"""
+    created_utc = user_data.get('created_utc', 0)
+    account_age = int(((time.time() if now is None else now) - created_utc) // (60 * 60 * 24))
+    total_karma = user_data.get('link_karma', 0) + user_data.get('comment_karma', 0)
+    return account_age, total_karma
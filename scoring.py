@@ -0,0 +1,189 @@
+from functools import lru_cache
+import os
+import time
+
+import numpy as np
+
+# ---------------------- Interest Options ----------------------
+
+MUSIC_OPTIONS = [
+    'Rock (Stage ka Raja)',
+    'Pop (Chartbuster vibes)',
+    'Hip-Hop (DHH wannabe)',
+    'Jazz (Smooth swag)',
+    'Classical (Sitar & stuff)',
+    'Electronic (DJ wale babu)',
+    'Country (Gaon ki dhun)',
+    'Reggae (Chill maar bro)',
+    'Blues (Dil tut gaya)',
+    'Metal (Headbang warning)',
+    'Folk (Desi beats)',
+    'R&B (Romance mode on)'
+]
+
+MOVIE_OPTIONS = [
+    'Action (Hero vibes only)',
+    'Comedy (LOL scenes)',
+    'Drama (Full filmy feels)',
+    'Fantasy (Magic & dhamaal)',
+    'Horror (Bhoot pret alert)',
+    'Mystery (Who\'s the culprit?)',
+    'Romance (Love-shove)',
+    'Thriller (Dil thamm ke dekho)',
+    'Sci-Fi (Space jugaad)',
+    'Documentary (Sach ka tadka)'
+]
+
+TOPIC_OPTIONS = [
+    'Memes (Hasi ka dose)',
+    'Politics (Jhanda lehrayega?)',
+    'Lifestyle (Swag level)',
+    'Technology (Tech geek)',
+    'Gaming (Noob ya pro?)',
+    'Fitness (Gym-shim)',
+    'Books (Padhaku vibes)',
+    'Science (Rocket science?)',
+    'Travel (Yatra mode)',
+    'Food (Tandoori tadka)'
+]
+
+# edit_profile.html spells the mystery option with a typographic apostrophe.
+# It gets its own bit so it only matches itself, like the string sets did.
+_VOCABULARIES = {
+    'music': MUSIC_OPTIONS,
+    'movies': MOVIE_OPTIONS + ['Mystery (Who’s the culprit?)'],
+    'topics': TOPIC_OPTIONS,
+}
+_BITS = {
+    category: {option: 1 << i for i, option in enumerate(options)}
+    for category, options in _VOCABULARIES.items()
+}
+
+MASK_WIDTH = max(len(options) for options in _VOCABULARIES.values())
+_POPCOUNT = np.array([bin(i).count('1') for i in range(1 << MASK_WIDTH)], dtype=np.int32)
+
+# How long the per-pair random bonus stays the same, in seconds
+JITTER_PERIOD = int(os.environ.get('MATCH_JITTER_PERIOD', 3600))
+
+# Column layout of an encoded profile row
+MUSIC, MOVIES, TOPICS, AGE = range(4)
+NO_AGE = -1
+
+# ---------------------- Encoding ----------------------
+
+@lru_cache(maxsize=8192)
+def encode_interests(category, text):
+    """Turn a comma-joined interest string into a bitmask for its category"""
+    if not text:
+        return 0
+    bits = _BITS[category]
+    mask = 0
+    for value in text.split(','):
+        # Values outside the form options can never be shared, so drop them
+        mask |= bits.get(value, 0)
+    return mask
+
+def encode_profile(user):
+    """Encode a user as (music mask, movie mask, topic mask, age)"""
+    return (
+        encode_interests('music', user.interests_music),
+        encode_interests('movies', user.interests_movies),
+        encode_interests('topics', user.interests_topics),
+        user.age if user.age is not None else NO_AGE,
+    )
+
+def encode_profiles(users):
+    """Encode a list of users into an (n, 4) int32 array"""
+    if not users:
+        return np.zeros((0, 4), dtype=np.int32)
+    return np.array([encode_profile(u) for u in users], dtype=np.int32)
+
+# ---------------------- Scoring ----------------------
+
+def score_vectors(viewer, profiles, jitter=None):
+    """Score an encoded viewer against an (n, 4) array of encoded profiles.
+
+    `jitter` is an optional length-n integer array added before scaling,
+    normally the per-pair bonus from candidate_jitter.
+    """
+    shared = (
+        _POPCOUNT[profiles[:, MUSIC] & viewer[MUSIC]] +
+        _POPCOUNT[profiles[:, MOVIES] & viewer[MOVIES]] +
+        _POPCOUNT[profiles[:, TOPICS] & viewer[TOPICS]]
+    )
+    score = shared * 10
+
+    # Age compatibility
+    ages = profiles[:, AGE]
+    age_diff = np.abs(ages - viewer[AGE])
+    age_bonus = np.select([age_diff <= 2, age_diff <= 5, age_diff <= 10], [20, 10, 5], 0)
+    if viewer[AGE] == NO_AGE:
+        age_bonus[:] = 0
+    else:
+        age_bonus[ages == NO_AGE] = 0
+    score = score + age_bonus
+
+    if jitter is not None:
+        score = score + jitter
+
+    return np.round(score / 3, 2)
+
+def _mix64(x):
+    """SplitMix64 finalizer over a uint64 array"""
+    with np.errstate(over='ignore'):
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(0xbf58476d1ce4e5b9)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94d049bb133111eb)
+        return x ^ (x >> np.uint64(31))
+
+def jitter_bucket(now=None):
+    """Current time bucket; jitter changes once per JITTER_PERIOD seconds"""
+    return int((time.time() if now is None else now) // JITTER_PERIOD)
+
+# The per-candidate step is plain integer arithmetic so SQL backends can
+# compute the exact same bonus (see jitter_sql in app.py)
+JITTER_MULTIPLIER = 2654435761
+
+def jitter_seed(viewer_id, bucket):
+    """32-bit seed for one viewer and time bucket"""
+    seed = _mix64(np.array([(viewer_id << 32) ^ bucket], dtype=np.uint64))[0]
+    return int(seed % np.uint64(1 << 32))
+
+def seeded_jitter(viewer_id, candidate_ids, bucket):
+    """Bonus in [0, 20] per candidate, fixed for a (viewer, candidate, bucket)"""
+    ids = np.asarray(candidate_ids, dtype=np.int64)
+    seed = jitter_seed(viewer_id, bucket)
+    return ((ids * JITTER_MULTIPLIER + seed) % (1 << 32) // 65536 % 21).astype(np.int32)
+
+def candidate_jitter(viewer, candidates, now=None):
+    """Seeded bonus for each candidate as seen by `viewer`"""
+    return seeded_jitter(viewer.id or 0, [c.id or 0 for c in candidates], jitter_bucket(now))
+
+def batch_scores(viewer, candidates, jitter=True):
+    """Score `viewer` against every candidate at once, returned as a list of floats"""
+    profiles = encode_profiles(candidates)
+    noise = candidate_jitter(viewer, candidates) if jitter else None
+    return score_vectors(encode_profile(viewer), profiles, noise).tolist()
+
+# ---------------------- Top-K Selection ----------------------
+
+def top_k_indices(scores, k):
+    """Indices of the `k` highest scores, best first.
+
+    Uses a partial selection so only the winners get fully sorted.
+    """
+    scores = np.asarray(scores)
+    if k <= 0:
+        return np.zeros(0, dtype=np.intp)
+    if k < len(scores):
+        picked = np.argpartition(-scores, k - 1)[:k]
+    else:
+        picked = np.arange(len(scores))
+    return picked[np.argsort(-scores[picked], kind='stable')]
+
+def rank_candidates(viewer, candidates, limit, offset=0, jitter=True):
+    """Return one page of best-first (candidate, score) pairs"""
+    profiles = encode_profiles(candidates)
+    noise = candidate_jitter(viewer, candidates) if jitter else None
+    scores = score_vectors(encode_profile(viewer), profiles, noise)
+    order = top_k_indices(scores, offset + limit)[offset:]
+    return [(candidates[i], float(scores[i])) for i in order]
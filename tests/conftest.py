@@ -0,0 +1,9 @@
+import os
+import sys
+import tempfile
+
+# The app reads its configuration at import, so point it at a scratch
+# database before any test imports it
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'test.db')
+os.environ.setdefault('SECRET_KEY', 'test')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,83 @@
+"""Pin the vectorised scorer to the original formula and the SQL backend to the Python one"""
+import random
+from types import SimpleNamespace
+
+import pytest
+
+import scoring
+from scoring import MUSIC_OPTIONS, MOVIE_OPTIONS, TOPIC_OPTIONS, batch_scores
+
+# Still stored on older profiles; the apostrophe is U+2019
+MYSTERY = 'Mystery (Who’s the culprit?)'
+
+def original_score(user1, user2):
+    """calculate_match_score as it was before batch scoring, minus the random bonus"""
+    score = 0
+    for field in ('interests_music', 'interests_movies', 'interests_topics'):
+        first, second = getattr(user1, field), getattr(user2, field)
+        if first and second:
+            score += len(set(first.split(',')) & set(second.split(','))) * 10
+    age_diff = abs(user1.age - user2.age)
+    if age_diff <= 2:
+        score += 20
+    elif age_diff <= 5:
+        score += 10
+    elif age_diff <= 10:
+        score += 5
+    return round(score / 3, 2)
+
+def random_profile(rng, user_id):
+    def pick(options):
+        return ','.join(rng.sample(options, rng.randint(0, 5)))
+    return SimpleNamespace(
+        id=user_id,
+        age=rng.randint(18, 45),
+        interests_music=pick(MUSIC_OPTIONS),
+        interests_movies=pick(MOVIE_OPTIONS + [MYSTERY]),
+        interests_topics=pick(TOPIC_OPTIONS)
+    )
+
+def test_batch_scores_match_original_formula():
+    rng = random.Random(7)
+    profiles = [random_profile(rng, i) for i in range(1, 301)]
+    profiles[0].interests_movies = MYSTERY
+    profiles[1].interests_movies = f'{MOVIE_OPTIONS[0]},{MYSTERY}'
+
+    for viewer in profiles[:20]:
+        assert batch_scores(viewer, profiles, jitter=False) == [original_score(viewer, p) for p in profiles]
+
+    # The mystery option has to count as a shared interest
+    assert batch_scores(profiles[0], [profiles[1]], jitter=False) > batch_scores(
+        SimpleNamespace(id=0, age=profiles[0].age, interests_music='', interests_movies='', interests_topics=''),
+        [profiles[1]], jitter=False
+    )
+
+@pytest.fixture(scope='module')
+def synth_app():
+    from app import app
+    from bench.synth import generate
+
+    with app.app_context():
+        generate(300, vibes_per_user=4, seed=3, echo=lambda message: None)
+        yield app
+
+@pytest.mark.parametrize('limit', [30, 1000])
+def test_sql_backend_matches_python_backend(synth_app, monkeypatch, limit):
+    import app as vibe_app
+    from app import User, rank_matches
+
+    # Keep both backends in the same jitter bucket
+    monkeypatch.setattr(scoring, 'JITTER_PERIOD', 10 ** 12)
+    for viewer_id in (1, 2, 17, 150, 299):
+        viewer = vibe_app.db.session.get(User, viewer_id)
+        results = {}
+        for backend in ('python', 'sql'):
+            monkeypatch.setattr(vibe_app, 'MATCH_SCORING_BACKEND', backend)
+            ranked, _ = rank_matches(viewer, limit)
+            results[backend] = ranked
+        python_scores = [score for _, score in results['python']]
+        assert python_scores == [score for _, score in results['sql']]
+        # Ties may come back in either order, but the same users must be ranked
+        if len(results['python']) < limit:
+            assert sorted((score, row.id) for row, score in results['python']) == \
+                sorted((score, row.id) for row, score in results['sql'])
@@ -0,0 +1,228 @@
+"""Stream users and vibes between databases as JSON lines.
+
+Works on both schemas found in the wild: the app's (users/vibes, see
+app.py) and the older models.py one (user/vibe, with `blocked` and a vibe
+`timestamp`) used by instances/*.db. Export files always use the app's
+field names, one {"table": ..., "row": {...}} object per line, users
+first. Either side may use either schema.
+
+Rows are read in id order a batch at a time and written a batch per
+transaction, so memory stays at one batch whatever the table size. On
+PostgreSQL batches are loaded with COPY.
+"""
+import gzip
+import io
+import json
+import sys
+import time
+from datetime import datetime
+
+from sqlalchemy import MetaData, Table, func, inspect, select, text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.types import DateTime
+
+USER_FIELDS = (
+    'id', 'reddit_username', 'nickname', 'age', 'bio', 'preferred_age_min', 'preferred_age_max',
+    'interests_music', 'interests_movies', 'interests_topics', 'account_age', 'karma', 'joined', 'is_banned'
+)
+VIBE_FIELDS = ('id', 'sender', 'receiver', 'sender_id', 'receiver_id', 'status', 'created_at')
+FIELDS = {'users': USER_FIELDS, 'vibes': VIBE_FIELDS}
+
+# Table names per schema, and export fields stored under another column name
+SCHEMAS = {
+    'app': {'tables': {'users': 'users', 'vibes': 'vibes'}, 'columns': {}},
+    'legacy': {'tables': {'users': 'user', 'vibes': 'vibe'}, 'columns': {'created_at': 'timestamp'}},
+}
+
+class BatchFailed(ValueError):
+    """An import batch was rolled back; the batches before it are committed"""
+
+def describe_error(error):
+    """The database's own message, without the statement parameters SQLAlchemy appends"""
+    return str(getattr(error, 'orig', None) or type(error).__name__).strip()
+
+def detect_schema(engine):
+    """'app' or 'legacy', or None when the database has neither"""
+    tables = set(inspect(engine).get_table_names())
+    for name, schema in SCHEMAS.items():
+        if set(schema['tables'].values()) <= tables:
+            return name
+    return None
+
+def open_dump(path, mode):
+    """Text stream for `path`: '-' is stdin/stdout and *.gz is gzipped"""
+    if path == '-':
+        return sys.stdout if 'w' in mode else sys.stdin
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot export {type(value).__name__}")
+
+def _reflect(engine, schema, kind):
+    return Table(SCHEMAS[schema]['tables'][kind], MetaData(), autoload_with=engine)
+
+def _to_record(schema, kind, table, row):
+    renamed = SCHEMAS[schema]['columns']
+    record = {}
+    for field in FIELDS[kind]:
+        column = renamed.get(field, field)
+        record[field] = row[column] if column in table.c else None
+    if kind == 'users' and 'blocked' in table.c:
+        record['is_banned'] = bool(record['is_banned'] or row['blocked'])
+    return record
+
+def export_rows(engine, out, batch_size=1000, echo=print):
+    """Write every user then every vibe of `engine` to `out`; returns {table: rows}"""
+    schema = detect_schema(engine)
+    if schema is None:
+        raise ValueError(f"{engine.url}: no user/vibe tables")
+
+    written = {}
+    with engine.connect() as conn:
+        for kind in ('users', 'vibes'):
+            table = _reflect(engine, schema, kind)
+            total = conn.execute(select(func.count()).select_from(table)).scalar()
+            started = time.monotonic()
+            done = 0
+            last_id = None
+            while True:
+                query = select(table).order_by(table.c.id).limit(batch_size)
+                if last_id is not None:
+                    query = query.where(table.c.id > last_id)
+                rows = conn.execute(query).mappings().all()
+                if not rows:
+                    break
+                last_id = rows[-1]['id']
+                out.write(''.join(
+                    json.dumps({'table': kind, 'row': _to_record(schema, kind, table, row)},
+                               default=_json_default) + '\n'
+                    for row in rows
+                ))
+                done += len(rows)
+                rate = done / max(time.monotonic() - started, 1e-6)
+                echo(f"{kind}: exported {done}/{total} rows ({rate:.0f} rows/s)")
+            written[kind] = done
+    out.flush()
+    return written
+
+def _from_record(schema, kind, table, record):
+    renamed = SCHEMAS[schema]['columns']
+    row = {}
+    for field in FIELDS[kind]:
+        column = renamed.get(field, field)
+        if column not in table.c:
+            continue
+        value = record.get(field)
+        if isinstance(value, str) and isinstance(table.c[column].type, DateTime):
+            value = datetime.fromisoformat(value)
+        row[column] = value
+    if kind == 'users' and 'blocked' in table.c:
+        row['blocked'] = bool(record.get('is_banned'))
+    return row
+
+def _resolve_user_ids(conn, users, rows):
+    """Point sender_id/receiver_id at the target's users, matched by username"""
+    names = {row['sender'] for row in rows} | {row['receiver'] for row in rows}
+    ids = dict(conn.execute(
+        select(users.c.reddit_username, users.c.id).where(users.c.reddit_username.in_(names))
+    ).all())
+    for row in rows:
+        row['sender_id'] = ids.get(row['sender'])
+        row['receiver_id'] = ids.get(row['receiver'])
+
+def _copy_value(value):
+    """One field in COPY's text format"""
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+def _copy_rows(conn, table, rows):
+    columns = list(rows[0])
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write('\t'.join(_copy_value(row[column]) for column in columns) + '\n')
+    buffer.seek(0)
+    quote = conn.dialect.identifier_preparer.quote
+    statement = f"COPY {quote(table.name)} ({', '.join(quote(column) for column in columns)}) FROM STDIN"
+    conn.connection.driver_connection.cursor().copy_expert(statement, buffer)
+
+def _insert_rows(conn, table, rows, skip_existing):
+    dialect = conn.dialect.name
+    if skip_existing and dialect in ('postgresql', 'sqlite'):
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        conn.execute(insert(table).on_conflict_do_nothing(), rows)
+    else:
+        conn.execute(table.insert(), rows)
+
+def import_rows(engine, lines, batch_size=1000, skip_existing=False, use_copy=True, echo=print):
+    """Load an export stream into `engine`; returns {table: rows}.
+
+    Each batch commits on its own, so an interrupted import can be resumed
+    with `skip_existing`, which inserts with ON CONFLICT DO NOTHING instead
+    of COPY.
+    """
+    schema = detect_schema(engine)
+    if schema is None:
+        raise ValueError(f"{engine.url}: no user/vibe tables, create the schema first")
+    tables = {kind: _reflect(engine, schema, kind) for kind in FIELDS}
+    copy = use_copy and not skip_existing and engine.dialect.name == 'postgresql'
+
+    loaded = {kind: 0 for kind in FIELDS}
+    batches = {kind: 0 for kind in FIELDS}
+    started = time.monotonic()
+
+    def flush(kind, records):
+        table = tables[kind]
+        rows = [_from_record(schema, kind, table, record) for record in records]
+        batches[kind] += 1
+        try:
+            with engine.begin() as conn:
+                if kind == 'vibes' and 'sender_id' in table.c:
+                    _resolve_user_ids(conn, tables['users'], rows)
+                if copy:
+                    _copy_rows(conn, table, rows)
+                else:
+                    _insert_rows(conn, table, rows, skip_existing)
+        except SQLAlchemyError as e:
+            first = loaded[kind] + 1
+            raise BatchFailed(
+                f"{kind}: batch {batches[kind]} (rows {first}-{first + len(rows) - 1}) failed: {describe_error(e)}"
+            ) from None
+        loaded[kind] += len(rows)
+        rate = sum(loaded.values()) / max(time.monotonic() - started, 1e-6)
+        echo(f"{kind}: imported {loaded[kind]} rows ({rate:.0f} rows/s)")
+
+    kind, batch = None, []
+    for line in lines:
+        if not line.strip():
+            continue
+        entry = json.loads(line)
+        if entry['table'] not in FIELDS:
+            raise ValueError(f"Unknown table in export: {entry['table']}")
+        if batch and (entry['table'] != kind or len(batch) >= batch_size):
+            flush(kind, batch)
+            batch = []
+        kind = entry['table']
+        batch.append(entry['row'])
+    if batch:
+        flush(kind, batch)
+
+    # COPY and explicit ids leave PostgreSQL sequences behind the data
+    if engine.dialect.name == 'postgresql':
+        with engine.begin() as conn:
+            quote = conn.dialect.identifier_preparer.quote
+            for table in tables.values():
+                conn.execute(text(
+                    f"SELECT setval(pg_get_serial_sequence(:name, 'id'), COALESCE(MAX(id), 0) + 1, false) "
+                    f"FROM {quote(table.name)}"
+                ), {'name': quote(table.name)})
+    return loaded